@@ -1,7 +1,8 @@
 from machine import *
 import lvgl as lv
+from lcd_bus import SPIBus
 from asyncio import create_task, sleep
-from waveshare import Board, ST7789SPI, CST328, UIApp, QMI8658, Page
+from waveshare import Board, ST7789DMA, CST328, UIApp, QMI8658, Page
 
 
 class MyBoard(Board):
@@ -37,9 +38,9 @@ class MyBoard(Board):
 
     scr_width = 240
     scr_height = 320
-    display = ST7789SPI(rst=39, cs=42, dc=41, blk=lcd_blk,
-                        spi=SPI(1, baudrate=20_000_000,  # polarity=0, phase=0, bits=8, firstbit=0,
-                                sck=Pin(40), mosi=Pin(45), miso=Pin(46)),
+    # queued DMA transfers, LVGL keeps rendering while a flush is on the wire
+    display = ST7789DMA(rst=39, blk=lcd_blk,
+                        bus=SPIBus(2, sck=40, mosi=45, dc=41, cs=42, freq=20_000_000),
                         width=scr_width, height=scr_height, dx=100, dy=100)
 
 
@@ -0,0 +1,3 @@
+import mphost
+
+mphost.install()
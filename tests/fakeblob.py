@@ -0,0 +1,149 @@
+# The blob module of user_mods/blob in Python, bytearray backed, for mphost.
+RGB444 = 12
+RGB565 = 16
+RGB666 = 18
+
+
+class Blob:
+    def __init__(self) -> None:
+        self.data = None
+        self.spiram = False
+
+    def malloc_dma(self, size, spiram=False):
+        if self.data is not None:
+            raise ValueError("free blob before use it")
+        if size <= 0:
+            raise ValueError("size should be positive")
+        self.data = bytearray(size)
+        self.spiram = spiram
+        return self
+
+    def malloc_pool(self, size, spiram=False, align=4):
+        return self.malloc_dma(size, spiram)
+
+    def free(self):
+        self.data = None
+
+    def memoryview(self):
+        return None if self.data is None else memoryview(self.data)
+
+    mv = memoryview
+
+    def bytearray(self):
+        return self.data
+
+    bs = bytearray
+
+    def view(self, offset=0, length=None):
+        if length is None:
+            length = len(self.data) - offset
+        return memoryview(self.data)[offset:offset + length]
+
+    def fill(self, byte, start=0, end=None):
+        mv = memoryview(self.data)[start:end]
+        mv[:] = bytes((byte & 0xFF,)) * len(mv)
+
+    def copy_from(self, src, offset=0):
+        src = memoryview(src).cast('B')
+        if offset + len(src) > len(self.data):
+            raise ValueError("blob too small")
+        self.data[offset:offset + len(src)] = src
+        return len(src)
+
+    def __buffer__(self, flags):
+        return memoryview(self.data)
+
+    def swap16(self, start=0, end=None):
+        swap16(self.data, start, end)
+
+    def fill16(self, value, start=0, end=None):
+        fill16(self.data, value, start, end)
+
+    def copy(self, dst, start=0, end=None, offset=0):
+        return copy(self.data, dst, start, end, offset)
+
+    def convert(self, dst, fmt, start=0, end=None, swap=False):
+        return convert(self.data, dst, fmt, start, end, swap)
+
+
+def as_bytes(buf):
+    if isinstance(buf, Blob):
+        buf = buf.data
+    return memoryview(buf).cast('B')
+
+
+def swap16(buf, start=0, end=None):
+    mv = as_bytes(buf)[start:end]
+    if len(mv) & 1:
+        raise ValueError("length should be even")
+    mv[0::2], mv[1::2] = bytes(mv[1::2]), bytes(mv[0::2])
+
+
+def fill16(buf, value, start=0, end=None):
+    mv = as_bytes(buf)[start:end]
+    mv[:] = value.to_bytes(2, 'little') * (len(mv) // 2)
+
+
+def copy(src, dst, start=0, end=None, offset=0):
+    data = bytes(as_bytes(src)[start:end])
+    out = as_bytes(dst)
+    if offset + len(data) > len(out):
+        raise ValueError("destination too small")
+    out[offset:offset + len(data)] = data
+    return len(data)
+
+
+def pixels(src, swap):
+    mv = as_bytes(src)
+    order = 'little' if swap else 'big'
+    return [int.from_bytes(mv[i:i + 2], order) for i in range(0, len(mv) - 1, 2)]
+
+
+def rgb565_to_rgb444(src, dst, swap=False):
+    px = pixels(src, swap)
+    out = bytearray()
+    for i in range(0, len(px), 2):
+        a = px[i]
+        b = px[i + 1] if i + 1 < len(px) else None
+        out.append((a >> 8) & 0xF0 | (a >> 7) & 0x0F)
+        if b is None:
+            out.append((a << 3) & 0xF0)
+        else:
+            out.append((a << 3) & 0xF0 | (b >> 12) & 0x0F)
+            out.append((b >> 3) & 0xF0 | (b >> 1) & 0x0F)
+    as_bytes(dst)[:len(out)] = out
+    return len(out)
+
+
+def rgb565_to_rgb666(src, dst, swap=False):
+    out = bytearray()
+    for a in pixels(src, swap):
+        r = a >> 11 & 0x1F
+        b = a & 0x1F
+        out += bytes(((r << 3 | r >> 2) & 0xFF, (a >> 3) & 0xFC, (b << 3 | b >> 2) & 0xFF))
+    as_bytes(dst)[:len(out)] = out
+    return len(out)
+
+
+def convert(src, dst, fmt, start=0, end=None, swap=False):
+    src = as_bytes(src)[start:end]
+    if fmt == RGB444:
+        return rgb565_to_rgb444(src, dst, swap)
+    elif fmt == RGB666:
+        return rgb565_to_rgb666(src, dst, swap)
+    elif fmt == RGB565:
+        n = copy(src, dst)
+        if swap:
+            swap16(dst, 0, n)
+        return n
+    else:
+        raise ValueError("unknown format")
+
+
+def heap_stats(spiram=False):
+    return {'free': 1 << 20, 'largest': 1 << 20, 'min_free': 1 << 20, 'allocated': 0,
+            'fragmentation': 0, 'pool_blocks': 0, 'pool_bytes': 0, 'pool_hits': 0}
+
+
+def pool_trim():
+    pass
@@ -0,0 +1,105 @@
+// Checks the rgb444/rgb666 packers against a per-pixel reference, then
+// reports bytes on the wire and conversion cost of an LVGL partial buffer.
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "pixel.h"
+
+#define WIDTH 320
+#define ROWS 48
+#define PIXELS (WIDTH * ROWS)
+#define ROUNDS 200
+#define SPI_HZ 80000000
+
+static uint8_t in[PIXELS * 2];
+static uint8_t out[PIXELS * 3];
+
+static uint16_t pixel(size_t i, bool swap) {
+    return swap ? (uint16_t)(in[2 * i + 1] << 8 | in[2 * i]) : (uint16_t)(in[2 * i] << 8 | in[2 * i + 1]);
+}
+
+// Nibble n of a packed rgb444 stream.
+static int nibble(size_t n) {
+    uint8_t b = out[n / 2];
+    return n & 1 ? b & 0x0F : b >> 4;
+}
+
+static int check_rgb444(size_t pixels, bool swap) {
+    size_t size = pack_rgb444(in, pixels, out, swap);
+    if(size != (pixels * 3 + 1) / 2) {
+        return 1;
+    }
+    for(size_t i = 0; i < pixels; i++) {
+        uint16_t a = pixel(i, swap);
+        if(nibble(3 * i) != a >> 12 || nibble(3 * i + 1) != (a >> 7 & 0x0F) || nibble(3 * i + 2) != (a >> 1 & 0x0F)) {
+            fprintf(stderr, "rgb444 pixel %zu of %zu\n", i, pixels);
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static int check_rgb666(size_t pixels, bool swap) {
+    size_t size = pack_rgb666(in, pixels, out, swap);
+    if(size != pixels * 3) {
+        return 1;
+    }
+    for(size_t i = 0; i < pixels; i++) {
+        uint16_t a = pixel(i, swap);
+        // upper six bits of every byte, the low two are ignored by the panel
+        if(out[3 * i] >> 3 != a >> 11 || out[3 * i + 1] >> 2 != (a >> 5 & 0x3F) || out[3 * i + 2] >> 3 != (a & 0x1F)) {
+            fprintf(stderr, "rgb666 pixel %zu of %zu\n", i, pixels);
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static double elapsed_ns(const struct timespec* start) {
+    struct timespec end;
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    return (end.tv_sec - start->tv_sec) * 1e9 + (end.tv_nsec - start->tv_nsec);
+}
+
+static void bench(const char* name, int bits) {
+    struct timespec start;
+    size_t size = 0;
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    for(int r = 0; r < ROUNDS; r++) {
+        if(bits == 12) {
+            size = pack_rgb444(in, PIXELS, out, true);
+        } else if(bits == 18) {
+            size = pack_rgb666(in, PIXELS, out, true);
+        } else {
+            memcpy(out, in, PIXELS * 2);
+            swap16(out, PIXELS * 2);
+            size = PIXELS * 2;
+        }
+    }
+    double ns = elapsed_ns(&start) / ROUNDS / PIXELS;
+    printf("%-7s %6zu bytes/flush %5.1f%% of rgb565 %7.1f us on the wire %6.2f ns/pixel to convert\n",
+        name, size, 100.0 * size / (PIXELS * 2), size * 8e6 / SPI_HZ, ns);
+}
+
+int main(void) {
+    srand(1);
+    for(size_t i = 0; i < sizeof(in); i++) {
+        in[i] = (uint8_t)rand();
+    }
+    size_t counts[] = {0, 1, 2, 3, 7, PIXELS};
+    for(size_t i = 0; i < sizeof(counts) / sizeof(counts[0]); i++) {
+        for(int swap = 0; swap < 2; swap++) {
+            if(check_rgb444(counts[i], swap) || check_rgb666(counts[i], swap)) {
+                return 1;
+            }
+        }
+    }
+
+    printf("%d x %d rgb565 flush, SPI at %d MHz\n", WIDTH, ROWS, SPI_HZ / 1000000);
+    bench("rgb565", 16);
+    bench("rgb444", 12);
+    bench("rgb666", 18);
+    return 0;
+}
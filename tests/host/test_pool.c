@@ -0,0 +1,133 @@
+// Pool allocator of the blob module against the malloc stand-in.
+#include <stdio.h>
+
+#include "pool.h"
+
+static int failures;
+
+#define CHECK(cond) do { \
+    if(!(cond)) { \
+        fprintf(stderr, "%s:%d: %s\n", __FILE__, __LINE__, #cond); \
+        failures++; \
+    } \
+} while(0)
+
+static pool_stats_t stats(bool spiram) {
+    pool_stats_t s;
+    pool_get_stats(spiram, &s);
+    return s;
+}
+
+static void test_miss_then_hit(void) {
+    int cls;
+    void* a = pool_alloc(1000, false, 4, &cls);
+    CHECK(a != NULL);
+    // 1000 bytes round up to the 1 KiB class
+    CHECK(cls == 2);
+    CHECK(((uintptr_t)a & (POOL_ALIGN - 1)) == 0);
+    CHECK(stats(false).misses == 1);
+    CHECK(stats(false).hits == 0);
+
+    pool_free(a, false, cls);
+    CHECK(stats(false).cached_blocks == 1);
+    CHECK(stats(false).cached_bytes == 1024);
+
+    // any size of the same class reuses the block
+    int cls2;
+    void* b = pool_alloc(600, false, 16, &cls2);
+    CHECK(b == a);
+    CHECK(cls2 == cls);
+    CHECK(stats(false).hits == 1);
+    CHECK(stats(false).cached_blocks == 0);
+    CHECK(stats(false).cached_bytes == 0);
+
+    // another class misses
+    void* c = pool_alloc(256, false, 4, &cls2);
+    CHECK(c != a);
+    CHECK(cls2 == 0);
+    CHECK(stats(false).misses == 2);
+    pool_free(b, false, cls);
+    pool_free(c, false, cls2);
+}
+
+static void test_spiram_is_separate(void) {
+    int cls;
+    pool_stats_t internal = stats(false);
+    void* a = pool_alloc(4096, true, 4, &cls);
+    CHECK(cls == 4);
+    CHECK(stats(true).misses == 1);
+    CHECK(stats(false).misses == internal.misses);
+    pool_free(a, true, cls);
+    CHECK(stats(true).cached_blocks == 1);
+    CHECK(stats(false).cached_blocks == internal.cached_blocks);
+
+    // an internal request of that class does not take the spiram block
+    int cls2;
+    void* b = pool_alloc(4096, false, 4, &cls2);
+    CHECK(b != a);
+    CHECK(stats(false).misses == internal.misses + 1);
+    CHECK(stats(true).cached_blocks == 1);
+    pool_free(b, false, cls2);
+}
+
+static void test_direct(void) {
+    int cls;
+    pool_stats_t before = stats(false);
+    // larger than the largest class
+    size_t large = ((size_t)1 << (POOL_MIN_SHIFT + POOL_CLASSES - 1)) + 1;
+    void* a = pool_alloc(large, false, 4, &cls);
+    CHECK(a != NULL);
+    CHECK(cls == POOL_DIRECT);
+    CHECK(stats(false).misses == before.misses + 1);
+    pool_free(a, false, cls);
+    // direct blocks go back to the heap, not to a free list
+    CHECK(stats(false).cached_blocks == before.cached_blocks);
+
+    // alignments above POOL_ALIGN bypass the pool too
+    void* b = pool_alloc(512, false, 4 * POOL_ALIGN, &cls);
+    CHECK(b != NULL);
+    CHECK(cls == POOL_DIRECT);
+    CHECK(((uintptr_t)b & (4 * POOL_ALIGN - 1)) == 0);
+    pool_free(b, false, cls);
+    CHECK(stats(false).cached_blocks == before.cached_blocks);
+    pool_free(NULL, false, 0);
+}
+
+static void test_trim(void) {
+    int cls[3];
+    void* blocks[3];
+    for(int i = 0; i < 3; i++) {
+        blocks[i] = pool_alloc(300, i == 2, 4, &cls[i]);
+    }
+    for(int i = 0; i < 3; i++) {
+        pool_free(blocks[i], i == 2, cls[i]);
+    }
+    CHECK(stats(false).cached_blocks >= 2);
+    CHECK(stats(true).cached_blocks >= 1);
+
+    pool_trim();
+    CHECK(stats(false).cached_blocks == 0);
+    CHECK(stats(false).cached_bytes == 0);
+    CHECK(stats(true).cached_blocks == 0);
+    CHECK(stats(true).cached_bytes == 0);
+
+    // nothing left to reuse
+    size_t misses = stats(false).misses;
+    void* a = pool_alloc(300, false, 4, &cls[0]);
+    CHECK(stats(false).misses == misses + 1);
+    pool_free(a, false, cls[0]);
+    pool_trim();
+}
+
+int main(void) {
+    test_miss_then_hit();
+    test_spiram_is_separate();
+    test_direct();
+    test_trim();
+    if(failures) {
+        fprintf(stderr, "%d failures\n", failures);
+        return 1;
+    }
+    printf("pool ok\n");
+    return 0;
+}
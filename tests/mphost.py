@@ -0,0 +1,288 @@
+# Host stand-ins to run the drivers under CPython. The waveshare package is
+# registered without running its __init__.py (which pulls in LVGL), so single
+# driver modules can be imported, and the buses are fakes that count what
+# would go on the wire.
+import asyncio
+import builtins
+import io
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if 'waveshare' not in sys.modules:
+        package = types.ModuleType('waveshare')
+        package.__path__ = [os.path.join(ROOT, 'waveshare')]
+        sys.modules['waveshare'] = package
+    if sys.implementation.name == 'micropython':
+        return
+    for name, attrs in (('micropython', micropython_module()), ('machine', machine_module()),
+                        ('framebuf', framebuf_module())):
+        if name not in sys.modules:
+            module = types.ModuleType(name)
+            module.__dict__.update(attrs)
+            sys.modules[name] = module
+    if 'blob' not in sys.modules:
+        import fakeblob
+        sys.modules['blob'] = fakeblob
+    # MicroPython additions to time and asyncio
+    for name, value in (('sleep_ms', lambda ms: None),
+                        ('ticks_ms', lambda: time.perf_counter_ns() // 1000000),
+                        ('ticks_us', lambda: time.perf_counter_ns() // 1000),
+                        ('ticks_diff', lambda a, b: a - b)):
+        if not hasattr(time, name):
+            setattr(time, name, value)
+    builtins.ptr8 = builtins.ptr16 = lambda buf: buf
+    builtins.ptr32 = ptr32
+    if not hasattr(asyncio, 'sleep_ms'):
+        asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+    if not hasattr(asyncio, 'ThreadSafeFlag'):
+        asyncio.ThreadSafeFlag = asyncio.Event
+
+
+def allocated(fn, *args):
+    # bytes allocated by one call: gc.mem_alloc on the board, the tracemalloc
+    # peak on the host (CPython float/tuple free lists hide some allocations
+    # there, ints above 256 are boxed, and calling a bound method with more
+    # than four arguments copies them: wrap such calls in a lambda)
+    try:
+        import gc
+        gc.mem_alloc
+    except AttributeError:
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*args)
+            return tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        fn(*args)
+        return gc.mem_alloc() - before
+    finally:
+        gc.enable()
+
+
+def micropython_module():
+    identity = lambda f: f
+    return {'const': lambda x: x, 'viper': identity, 'native': identity}
+
+
+class GPIO:
+    # the output register of pins 0..31, driven both by the fake Pins and by
+    # viper code writing GPIO_OUT_W1TS/W1TC; bytes on a parallel bus are
+    # latched on the rising edge of its clock pin
+    def __init__(self) -> None:
+        self.out = 0
+        self.writes = 0
+        self.clock = None
+        self.bus = ()
+        self.latched = bytearray()
+
+    def watch(self, clock, bus):
+        self.clock = 1 << clock
+        self.bus = bus
+        self.latched = bytearray()
+        self.writes = 0
+
+    def set(self, mask):
+        self.writes += 1
+        rising = self.clock is not None and mask & self.clock and not self.out & self.clock
+        self.out |= mask
+        if rising:
+            b = 0
+            for i, pin in enumerate(self.bus):
+                if self.out >> pin & 1:
+                    b |= 1 << i
+            self.latched.append(b)
+
+    def clear(self, mask):
+        self.writes += 1
+        self.out -= self.out & mask
+
+
+gpio = GPIO()
+
+# ESP32-S3 GPIO_OUT_W1TS_REG / GPIO_OUT_W1TC_REG
+GPIO_REGISTERS = {0x60004008: gpio.set, 0x6000400C: gpio.clear}
+
+
+class Register:
+    def __init__(self, write) -> None:
+        self.write = write
+
+    def __setitem__(self, index, value):
+        self.write(value)
+
+
+def ptr32(address):
+    # viper pointers: a buffer is indexed as is, an int is a register
+    if isinstance(address, int):
+        return Register(GPIO_REGISTERS[address])
+    return address
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    def __init__(self, id, mode=None, pull=None, value=None) -> None:
+        self.id = id
+        self.mask = 1 << id
+        self.v = 0
+        if value is not None:
+            self(value)
+
+    def __call__(self, v=None):
+        if v is None:
+            return self.v
+        self.v = v
+        if v:
+            gpio.set(self.mask)
+        else:
+            gpio.clear(self.mask)
+
+    value = __call__
+
+    def irq(self, handler=None, trigger=None):
+        self.handler = handler
+
+
+class PWM:
+    def __init__(self, pin, duty=0, freq=0) -> None:
+        self.pin = pin
+        self.d = duty
+
+    def duty(self, d=None):
+        if d is None:
+            return self.d
+        self.d = d
+
+    def deinit(self):
+        pass
+
+
+def machine_module():
+    return {'Pin': Pin, 'PWM': PWM, 'SPI': FakeSPI, 'I2C': FakeI2C}
+
+
+class FrameBuffer:
+    # drawing is not emulated, the drivers only need the buffer
+    def __init__(self, buf, width, height, format, stride=None) -> None:
+        self.fb = (buf, width, height, format)
+
+    def fill(self, c):
+        pass
+
+    def pixel(self, x, y, c=None):
+        pass
+
+    def hline(self, x, y, w, c):
+        pass
+
+    def vline(self, x, y, h, c):
+        pass
+
+    def line(self, x1, y1, x2, y2, c):
+        pass
+
+    def rect(self, x, y, w, h, c, f=False):
+        pass
+
+    def fill_rect(self, x, y, w, h, c):
+        pass
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=0xF):
+        pass
+
+    def poly(self, x, y, coords, c, f=False):
+        pass
+
+    def text(self, s, x, y, c=1):
+        pass
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        pass
+
+    def scroll(self, xstep, ystep):
+        pass
+
+
+def framebuf_module():
+    return {'FrameBuffer': FrameBuffer, 'RGB565': 1}
+
+
+def as_bytes(buf):
+    return memoryview(buf).cast('B')
+
+
+class FakeSPI:
+    # counts write() calls and bytes, optionally keeping what was sent
+    def __init__(self, *args, record=False, **kwargs) -> None:
+        self.transactions = 0
+        self.bytes = 0
+        self.record = record
+        self.sent = []
+
+    def write(self, buf):
+        self.transactions += 1
+        self.bytes += buf.nbytes if isinstance(buf, memoryview) else len(buf)
+        if self.record:
+            self.sent.append(bytes(buf))
+
+
+class FakeI2C:
+    # a 256 byte register file per device address, read through BytesIO so
+    # the fake itself does not allocate
+    def __init__(self, *args, **kwargs) -> None:
+        self.devices = {}
+        self.transactions = 0
+
+    def device(self, addr):
+        if addr not in self.devices:
+            self.devices[addr] = io.BytesIO(bytes(256))
+        return self.devices[addr]
+
+    def regs(self, addr):
+        return self.device(addr).getbuffer()
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        self.transactions += 1
+        f = self.device(addr)
+        f.seek(reg)
+        f.readinto(buf)
+
+    def readfrom_mem(self, addr, reg, n):
+        buf = bytearray(n)
+        self.readfrom_mem_into(addr, reg, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, reg, buf):
+        self.transactions += 1
+        data = bytes(as_bytes(buf))
+        self.regs(addr)[reg:reg + len(data)] = data
+
+
+def load_trace(name):
+    # tests/traces/<name>.csv: '# dt=<seconds> ...', a header, then one sample per row
+    path = os.path.join(ROOT, 'tests', 'traces', name + '.csv')
+    with open(path) as f:
+        comment = f.readline()
+        dt = float(comment.split()[1].split('=')[1])
+        f.readline()
+        rows = [tuple(float(v) for v in line.split(',')) for line in f if line.strip()]
+    return dt, rows
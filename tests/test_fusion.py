@@ -0,0 +1,65 @@
+from array import array
+from math import degrees, radians
+
+import pytest
+
+from mphost import load_trace
+from waveshare.fusion import Mahony
+
+
+def run_samples(fusion, name):
+    dt, rows = load_trace(name)
+    for row in rows:
+        fusion.update(*row, dt)
+    return fusion
+
+
+def run_batches(fusion, name, size=16):
+    dt, rows = load_trace(name)
+    for i in range(0, len(rows), size):
+        block = array('f', [v for row in rows[i:i + size] for v in row])
+        fusion.update_batch(block, dt)
+    return fusion
+
+
+def test_tilt_converges():
+    roll, pitch, yaw = run_samples(Mahony(kp=2.0), 'tilt_roll30').euler()
+    assert degrees(roll) == pytest.approx(30, abs=1)
+    assert degrees(pitch) == pytest.approx(0, abs=1)
+
+
+def test_batches_match_samples():
+    one = run_samples(Mahony(kp=2.0, ki=0.1), 'tilt_roll30').quaternion()
+    batched = run_batches(Mahony(kp=2.0, ki=0.1), 'tilt_roll30').quaternion()
+    assert batched == pytest.approx(one, abs=1e-5)
+
+
+def test_batch_sizes_agree():
+    a = run_batches(Mahony(), 'yaw_turn', size=1).quaternion()
+    b = run_batches(Mahony(), 'yaw_turn', size=64).quaternion()
+    assert b == pytest.approx(a, abs=1e-5)
+
+
+def test_gyroscope_integrates_yaw():
+    # 0.5 rad/s for 2 s, the accelerometer can not correct yaw
+    yaw = run_samples(Mahony(), 'yaw_turn').euler()[2]
+    assert yaw == pytest.approx(1.0, abs=0.02)
+
+
+def test_bias_is_removed():
+    drift = run_samples(Mahony(), 'gyro_bias').euler()[2]
+    assert drift == pytest.approx(0.25, abs=0.02)
+    fixed = run_samples(Mahony(bias=(0, 0, 0.05)), 'gyro_bias').euler()[2]
+    assert fixed == pytest.approx(0, abs=0.01)
+
+
+def test_gain():
+    # without feedback the level start is never corrected
+    roll = run_samples(Mahony(kp=0.0), 'tilt_roll30').euler()[0]
+    assert abs(roll) < radians(1)
+
+
+def test_reset():
+    fusion = run_samples(Mahony(kp=2.0), 'tilt_roll30')
+    fusion.reset()
+    assert fusion.quaternion() == (1.0, 0.0, 0.0, 0.0)
@@ -0,0 +1,15 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+HOST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'host')
+
+
+@pytest.mark.skipif(not shutil.which('make') or not shutil.which(os.environ.get('CC', 'cc')),
+                    reason="no host C toolchain")
+def test_host_c_build():
+    # the plain C parts of user_mods/blob, built and run against malloc
+    result = subprocess.run(['make', '-s', '-C', HOST, 'test'], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,50 @@
+import struct
+
+from mphost import FakeI2C
+from waveshare.i2c_device import I2CDevice, RegByte, RegStructure
+
+ADDR = 0x6B
+
+
+class Device(I2CDevice):
+    status = RegByte(0x2D)
+    acc_data = RegStructure(0x35, '<hhh')
+
+
+def make_device():
+    i2c = FakeI2C()
+    i2c.regs(ADDR)[0x35:0x3B] = struct.pack('<hhh', 100, -200, 16384)
+    i2c.regs(ADDR)[0x2D] = 0x81
+    return i2c, Device(i2c, ADDR)
+
+
+def test_structure_is_one_burst():
+    i2c, dev = make_device()
+    assert dev.acc_data == (100, -200, 16384)
+    # one auto-incrementing read instead of one per byte
+    assert i2c.transactions == 1
+
+
+def test_structure_reuses_its_buffer():
+    i2c, dev = make_device()
+    buf = Device.acc_data.buf
+    for _ in range(10):
+        dev.acc_data
+    assert Device.acc_data.buf is buf
+    assert i2c.transactions == 10
+
+
+def test_read_reg_into_fills_the_buffer():
+    i2c, dev = make_device()
+    buf = bytearray(6)
+    assert dev.read_reg_into(0x35, buf) is buf
+    assert struct.unpack('<hhh', buf) == (100, -200, 16384)
+    assert i2c.transactions == 1
+
+
+def test_bytes():
+    i2c, dev = make_device()
+    assert dev.status == 0x81
+    dev.status = 0x01
+    assert i2c.regs(ADDR)[0x2D] == 0x01
+    assert i2c.transactions == 2
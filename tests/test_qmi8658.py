@@ -0,0 +1,101 @@
+from array import array
+import struct
+
+import mphost
+from mphost import FakeI2C, allocated
+
+mphost.install()
+from waveshare.qmi8658 import (QMI8658, QMI8658_ADDR2, REG_TEMP_L, REG_CTRL1, REG_CTRL7,
+                                CTRL1_INT2_EN, CTRL7_DRDY_DIS)
+
+SAMPLE = (5000, 100, -200, 16384, 10, -20, 30)
+BATCH = 32
+
+
+def make_imu():
+    i2c = FakeI2C()
+    regs = i2c.regs(QMI8658_ADDR2)
+    regs[0x00] = 0x05
+    regs[0x4D] = 0x80
+    regs[REG_TEMP_L:REG_TEMP_L + 14] = struct.pack('<7h', *SAMPLE)
+    return i2c, QMI8658(i2c)
+
+
+def per_sample(fn, samples=1):
+    # bytes allocated per sample, after one warm-up call
+    fn()
+    return allocated(fn) / samples
+
+
+def benchmark():
+    i2c, imu = make_imu()
+    raw = array('h', SAMPLE[1:] * BATCH)
+    out = array('f', bytes(4 * len(raw)))
+    return {
+        'read_all': per_sample(lambda: imu.read_all()),
+        'read_raw_accelerometer': per_sample(lambda: imu.read_raw_accelerometer()),
+        'read_raw_gyroscope': per_sample(lambda: imu.read_raw_gyroscope()),
+        'read_accelerometer': per_sample(lambda: imu.read_accelerometer()),
+        'read_gyproscope': per_sample(lambda: imu.read_gyproscope()),
+        'scale_batch': per_sample(lambda: imu.scale_batch(raw, out), BATCH),
+    }
+
+
+def test_raw_reads():
+    i2c, imu = make_imu()
+    assert tuple(imu.read_all()) == SAMPLE
+    assert tuple(imu.read_raw_accelerometer()) == SAMPLE[1:4]
+    assert tuple(imu.read_raw_gyroscope()) == SAMPLE[4:]
+    assert i2c.transactions > 0
+
+
+def test_scale_batch_matches_float_reads():
+    i2c, imu = make_imu()
+    raw = array('h', SAMPLE[1:] * 4)
+    out = imu.scale_batch(raw, array('f', bytes(4 * len(raw))))
+    acc = imu.read_accelerometer()
+    gyro = imu.read_gyproscope()
+    for i in range(0, len(raw), 6):
+        for j in range(3):
+            assert abs(out[i + j] - acc[j]) < 1e-6
+            assert abs(out[i + 3 + j] - gyro[j]) < 1e-6
+
+
+def test_allocations_per_sample():
+    result = benchmark()
+    assert result['read_all'] == 0
+    assert result['read_raw_accelerometer'] == 0
+    assert result['read_raw_gyroscope'] == 0
+    # at least the returned tuple, the floats are hidden by CPython's free list
+    assert result['read_accelerometer'] > 0
+    assert result['read_gyproscope'] > 0
+    assert result['scale_batch'] < result['read_accelerometer']
+
+
+def test_disable_data_ready_restores_int2():
+    i2c, imu = make_imu()
+    regs = i2c.regs(QMI8658_ADDR2)
+    regs[REG_CTRL7] |= CTRL7_DRDY_DIS
+    ctrl1 = regs[REG_CTRL1]
+    assert not ctrl1 & CTRL1_INT2_EN
+    imu.enable_data_ready()
+    imu.enable_data_ready()
+    assert regs[REG_CTRL1] & CTRL1_INT2_EN
+    assert not regs[REG_CTRL7] & CTRL7_DRDY_DIS
+    imu.disable_data_ready()
+    assert regs[REG_CTRL1] == ctrl1
+    assert regs[REG_CTRL7] & CTRL7_DRDY_DIS
+
+
+def test_disable_data_ready_keeps_int2_enabled_before():
+    i2c, imu = make_imu()
+    regs = i2c.regs(QMI8658_ADDR2)
+    imu.ctrl1 |= CTRL1_INT2_EN
+    imu.enable_data_ready()
+    imu.disable_data_ready()
+    assert regs[REG_CTRL1] & CTRL1_INT2_EN
+
+
+if __name__ == '__main__':
+    for name, size in benchmark().items():
+        print('%-24s %6.1f bytes/sample' % (name, size))
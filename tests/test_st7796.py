@@ -0,0 +1,183 @@
+from os import uname
+import time
+
+import mphost
+from mphost import FakeSPI, allocated, gpio
+
+mphost.install()
+from waveshare import st7796
+from waveshare.dirty import DirtyRects
+from waveshare.st7796 import ST7796SPI, TRACKED_METHODS
+
+
+def make_display(dx=0, dy=0):
+    spi = FakeSPI()
+    display = ST7796SPI(rst=1, cs=2, dc=3, blk=4, spi=spi, dx=dx, dy=dy)
+    return spi, display
+
+
+def test_block_sends_window_only_when_it_changes():
+    spi, display = make_display()
+    data = bytearray(20 * 10 * 2)
+    spi.transactions = display.transactions = 0
+    display.block(0, 0, 19, 9, data)
+    # CASET, RASET and RAMWR with their data
+    assert spi.transactions == display.transactions == 6
+    display.block(0, 0, 19, 9, data)
+    assert spi.transactions == 8
+    display.block(0, 10, 19, 19, data)
+    assert spi.transactions == 12
+
+
+def test_block_does_not_allocate():
+    spi, display = make_display()
+    # CPython boxes ints above 256, keep the counters below that
+    data = bytearray(12 * 5 * 2)
+    display.block(0, 0, 11, 4, data)
+    spi.transactions = spi.bytes = display.transactions = gpio.writes = 0
+    assert allocated(lambda: display.block(0, 0, 11, 4, data)) == 0
+    spi.transactions = spi.bytes = display.transactions = gpio.writes = 0
+    assert allocated(lambda: display.block(0, 5, 11, 9, data)) == 0
+
+
+def test_allocations_are_seen():
+    spi, display = make_display()
+    assert allocated(display.define_scroll, 0, 100) > 0
+
+
+def test_packed_formats_reuse_their_buffer():
+    spi, display = make_display()
+    data = bytearray(20 * 10 * 2)
+    for bits in (12, 18):
+        display.set_pixel_format(bits)
+        display.block(0, 0, 19, 9, data)
+        before = spi.bytes
+        display.block(0, 0, 19, 9, data)
+        assert spi.bytes - before == display.wire_bytes(200) + 1
+        blob = display.pack_blob
+        display.block(0, 0, 19, 9, data)
+        assert display.pack_blob is blob
+
+
+
+def test_dirty_rects_merge_within_slack():
+    dirty = DirtyRects(100, 100, slack=0)
+    dirty.add(0, 0, 9, 9)
+    # adjacent, the bounding box adds nothing
+    dirty.add(10, 0, 19, 9)
+    assert dirty.rects == [[0, 0, 19, 9]]
+    # the bounding box would cover 300 more pixels
+    dirty.add(0, 20, 9, 29)
+    assert dirty.rects == [[0, 0, 19, 9], [0, 20, 9, 29]]
+
+    dirty = DirtyRects(100, 100, slack=300)
+    dirty.add(0, 0, 19, 9)
+    dirty.add(0, 20, 9, 29)
+    assert dirty.rects == [[0, 0, 19, 29]]
+
+
+def test_dirty_rects_default_slack_and_clipping():
+    dirty = DirtyRects(100, 50)
+    assert dirty.slack == 800
+    dirty.add(-5, -5, 4, 4)
+    dirty.add(95, 45, 120, 60)
+    assert dirty.rects == [[0, 0, 4, 4], [95, 45, 99, 49]]
+    dirty.add(200, 0, 210, 10)
+    assert len(dirty) == 2
+
+
+def test_dirty_rects_collapse_beyond_max_rects():
+    dirty = DirtyRects(100, 100, slack=0, max_rects=3)
+    for i in range(3):
+        dirty.add(i * 30, i * 30, i * 30 + 1, i * 30 + 1)
+    assert len(dirty) == 3
+    dirty.add(95, 0, 99, 1)
+    assert dirty.rects == [[0, 0, 99, 61]]
+    dirty.clear()
+    assert len(dirty) == 0
+    dirty.add_all()
+    assert dirty.rects == [[0, 0, 99, 99]]
+
+
+def test_tracking_is_bound_only_when_enabled():
+    spi, display = make_display(120, 240)
+    for name in TRACKED_METHODS:
+        assert name not in display.__dict__
+    display.track_dirty(slack=0)
+    display.update()
+    display.pixel(5, 6, 0xFFFF)
+    display.fill_rect(100, 200, 10, 20, 0)
+    assert display.dirty.rects == [[5, 6, 5, 6], [100, 200, 109, 219]]
+    display.track_dirty(False)
+    for name in TRACKED_METHODS:
+        assert name not in display.__dict__
+    display.pixel(5, 6, 0)
+    assert display.dirty is None
+
+
+def test_update_sends_only_dirty_rows():
+    spi, display = make_display(120, 240)
+    display.track_dirty()
+    display.update()
+    before = spi.bytes
+    display.hline(10, 20, 30, 0xFFFF)
+    display.update()
+    # the window and one row of 30 pixels
+    assert spi.bytes - before == 30 * 2 + 1 + 2 * (1 + 4)
+
+
+WR = 5
+BUS = (6, 7, 8, 9, 10, 11, 12, 13)
+
+
+class Uname:
+    machine = 'ESP32S3 module with ESP32S3'
+
+
+def make_parallel(direct):
+    if direct:
+        st7796.uname = lambda: Uname
+    try:
+        display = st7796.ST7796PY(rst=1, cs=2, dc=3, blk=4, wr=WR, data=BUS)
+    finally:
+        st7796.uname = uname
+    assert (display.lut is not None) == direct
+    gpio.watch(WR, BUS)
+    return display
+
+
+def parallel_benchmark(size=320 * 2):
+    # gpio writes and seconds per byte, per pin versus through write_bus
+    data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+    result = {}
+    for direct in (False, True):
+        display = make_parallel(direct)
+        start = time.perf_counter()
+        display.write_data(data)
+        elapsed = time.perf_counter() - start
+        assert gpio.latched == data
+        result['write_bus' if direct else 'pins'] = (gpio.writes / size, elapsed / size)
+    return result
+
+
+def test_parallel_bus_latches_every_byte():
+    data = b'\x00\x5a\xa5\xff\x81\x01\x80'
+    for direct in (False, True):
+        display = make_parallel(direct)
+        display.write_data(data)
+        assert gpio.latched == data
+        gpio.watch(WR, BUS)
+        display.write_cmd(0x2C, 1, 2)
+        assert gpio.latched == b'\x2c\x01\x02'
+
+
+def test_write_bus_is_three_register_writes_per_byte():
+    result = parallel_benchmark()
+    # cs and dc once per buffer, then clear, set data and raise wr
+    assert result['write_bus'][0] < 3.01
+    assert result['pins'][0] > 10
+
+
+if __name__ == '__main__':
+    for name, (writes, seconds) in parallel_benchmark().items():
+        print('%-10s %5.1f gpio writes/byte %8.3f us/byte' % (name, writes, seconds * 1e6))
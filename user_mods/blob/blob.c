@@ -4,19 +4,15 @@
 #include "py/obj.h"
 #include "py/objarray.h"
 
+#include <string.h>
+
 #include "blob.h"
 
 
 void* malloc_dma(size_t size, bool spiram) {
 
     // allocate heap memory
-    uint32_t caps = MALLOC_CAP_8BIT | MALLOC_CAP_DMA;
-    if(spiram) {
-        caps |= MALLOC_CAP_SPIRAM;
-    } else {
-        caps |= MALLOC_CAP_INTERNAL;
-    }
-    void* data = heap_caps_malloc(size, caps);
+    void* data = heap_caps_malloc(size, pool_caps(spiram));
     return data;
 }
 
@@ -31,6 +27,8 @@ mp_obj_t new_dma_blob(size_t size, bool spiram) {
     Blob_obj_t* self = mp_obj_malloc(Blob_obj_t, &type_Blob);
     self->data = data;
     self->size = size;
+    self->pool = POOL_NONE;
+    self->spiram = spiram;
     return MP_OBJ_FROM_PTR(self);
 }
 
@@ -39,6 +37,8 @@ static mp_obj_t Blob_make_new(const mp_obj_type_t *type, size_t n_args, size_t n
     Blob_obj_t* self = mp_obj_malloc(Blob_obj_t, type);
     self->size = 0;
     self->data = NULL;
+    self->pool = POOL_NONE;
+    self->spiram = false;
     return MP_OBJ_FROM_PTR(self);;
 }
 
@@ -86,18 +86,71 @@ static mp_obj_t Blob_malloc_dma(size_t n_args, const mp_obj_t *pos_args, mp_map_
     }
     self->data = data;
     self->size = usize;
+    self->pool = POOL_NONE;
+    self->spiram = spiram;
 
     return MP_OBJ_FROM_PTR(self);
 }
 
 static MP_DEFINE_CONST_FUN_OBJ_KW(Blob_malloc_dma_obj, 1, Blob_malloc_dma);
 
+// Allocate DMA-compatible memory from the pool, free() gives it back for reuse.
+static mp_obj_t Blob_malloc_pool(size_t n_args, const mp_obj_t *pos_args, mp_map_t *kw_args) {
+    static const mp_arg_t allowed_args[] = {
+        { MP_QSTR_self, MP_ARG_REQUIRED | MP_ARG_OBJ, {.u_obj = MP_OBJ_NULL} },
+        { MP_QSTR_size, MP_ARG_REQUIRED | MP_ARG_INT, {.u_int = -1} },
+        { MP_QSTR_spiram, MP_ARG_KW_ONLY | MP_ARG_BOOL, {.u_bool = false} },
+        { MP_QSTR_align, MP_ARG_KW_ONLY | MP_ARG_INT, {.u_int = 4} },
+    };
+
+    mp_arg_val_t args[MP_ARRAY_SIZE(allowed_args)];
+    mp_arg_parse_all(n_args, pos_args, kw_args, MP_ARRAY_SIZE(allowed_args), allowed_args, args);
+
+    Blob_obj_t *self = MP_OBJ_TO_PTR(args[0].u_obj);
+    if(self->data != NULL) {
+        mp_raise_ValueError("free blob before use it");
+        return mp_const_none;
+    }
+    mp_int_t size = args[1].u_int;
+    bool spiram = args[2].u_bool;
+    mp_int_t align = args[3].u_int;
+
+    if(size <= 0) {
+        mp_raise_ValueError("size should be positive");
+        return mp_const_none;
+    }
+    if(align <= 0 || (align & (align - 1)) != 0) {
+        mp_raise_ValueError("align should be a power of 2");
+        return mp_const_none;
+    }
+
+    int cls;
+    void* data = pool_alloc((size_t)size, spiram, (size_t)align, &cls);
+    if(data == NULL) {
+        mp_raise_OSError(CANNOT_ALLOCATE_MEMORY);
+        return mp_const_none;
+    }
+    self->data = data;
+    self->size = (size_t)size;
+    self->pool = cls;
+    self->spiram = spiram;
+
+    return MP_OBJ_FROM_PTR(self);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_KW(Blob_malloc_pool_obj, 1, Blob_malloc_pool);
+
 static mp_obj_t Blob_free(mp_obj_t self_in) {
     Blob_obj_t *self = MP_OBJ_TO_PTR(self_in);
     if(self->data != NULL) {
-        heap_caps_free(self->data);
+        if(self->pool == POOL_NONE) {
+            heap_caps_free(self->data);
+        } else {
+            pool_free(self->data, self->spiram, self->pool);
+        }
         self->data = NULL;
         self->size = 0;
+        self->pool = POOL_NONE;
     }
     return mp_const_none;
 }
@@ -126,14 +179,242 @@ static mp_obj_t Blob_bytearray(mp_obj_t self_in) {
 }
 static MP_DEFINE_CONST_FUN_OBJ_1(Blob_bytearray_obj, Blob_bytearray);
 
+// Byte range [start, end) of a buffer, end defaults to the whole buffer.
+static uint8_t* get_range(mp_obj_t buf_in, size_t n_args, const mp_obj_t* args, size_t first, mp_uint_t flags, size_t* len) {
+    mp_buffer_info_t info;
+    mp_get_buffer_raise(buf_in, &info, flags);
+    mp_int_t start = 0;
+    mp_int_t end = info.len;
+    if(n_args > first && args[first] != mp_const_none) {
+        start = mp_obj_get_int(args[first]);
+    }
+    if(n_args > first + 1 && args[first + 1] != mp_const_none) {
+        end = mp_obj_get_int(args[first + 1]);
+    }
+    if(start < 0 || end > (mp_int_t)info.len || start > end) {
+        mp_raise_ValueError("range out of the buffer");
+    }
+    *len = end - start;
+    return (uint8_t*)info.buf + start;
+}
+
+// swap16(buf, start=0, end=None), byte swap rgb565 in place.
+static mp_obj_t blob_swap16(size_t n_args, const mp_obj_t *args) {
+    size_t len;
+    uint8_t* data = get_range(args[0], n_args, args, 1, MP_BUFFER_WRITE, &len);
+    if(len & 1) {
+        mp_raise_ValueError("length should be even");
+    }
+    swap16(data, len);
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(blob_swap16_obj, 1, 3, blob_swap16);
+
+// fill16(buf, value, start=0, end=None)
+static mp_obj_t blob_fill16(size_t n_args, const mp_obj_t *args) {
+    size_t len;
+    uint8_t* data = get_range(args[0], n_args, args, 2, MP_BUFFER_WRITE, &len);
+    if(len & 1) {
+        mp_raise_ValueError("length should be even");
+    }
+    fill16(data, len, (uint16_t)mp_obj_get_int(args[1]));
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(blob_fill16_obj, 2, 4, blob_fill16);
+
+// copy(src, dst, start=0, end=None, offset=0), src[start:end] to dst[offset:]
+static mp_obj_t blob_copy(size_t n_args, const mp_obj_t *args) {
+    size_t len;
+    uint8_t* src = get_range(args[0], n_args, args, 2, MP_BUFFER_READ, &len);
+    mp_int_t offset = n_args > 4 ? mp_obj_get_int(args[4]) : 0;
+    mp_buffer_info_t dst;
+    mp_get_buffer_raise(args[1], &dst, MP_BUFFER_WRITE);
+    if(offset < 0 || offset + len > dst.len) {
+        mp_raise_ValueError("destination too small");
+    }
+    memmove((uint8_t*)dst.buf + offset, src, len);
+    return mp_obj_new_int(len);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(blob_copy_obj, 2, 5, blob_copy);
+
+// convert(src, dst, fmt, start=0, end=None, swap=False), rgb565 into fmt
+static mp_obj_t blob_convert(size_t n_args, const mp_obj_t *args) {
+    size_t len;
+    const uint8_t* src = get_range(args[0], n_args, args, 3, MP_BUFFER_READ, &len);
+    mp_int_t fmt = mp_obj_get_int(args[2]);
+    bool swap = n_args > 5 && mp_obj_is_true(args[5]);
+    mp_buffer_info_t dst;
+    mp_get_buffer_raise(args[1], &dst, MP_BUFFER_WRITE);
+
+    size_t pixels = len / 2;
+    size_t size;
+    if(fmt == FORMAT_RGB444) {
+        size = (pixels * 3 + 1) / 2;
+    } else if(fmt == FORMAT_RGB565) {
+        size = pixels * 2;
+    } else if(fmt == FORMAT_RGB666) {
+        size = pixels * 3;
+    } else {
+        mp_raise_ValueError("unknown format");
+    }
+    if(dst.len < size) {
+        mp_raise_ValueError("destination too small");
+    }
+
+    if(fmt == FORMAT_RGB444) {
+        pack_rgb444(src, pixels, dst.buf, swap);
+    } else if(fmt == FORMAT_RGB666) {
+        pack_rgb666(src, pixels, dst.buf, swap);
+    } else {
+        memmove(dst.buf, src, size);
+        if(swap) {
+            swap16(dst.buf, size);
+        }
+    }
+    return mp_obj_new_int(size);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(blob_convert_obj, 3, 6, blob_convert);
+
+static mp_obj_t rgb565_to_rgb444(size_t n_args, const mp_obj_t *args) {
+    mp_buffer_info_t src;
+    mp_buffer_info_t dst;
+    mp_get_buffer_raise(args[0], &src, MP_BUFFER_READ);
+    mp_get_buffer_raise(args[1], &dst, MP_BUFFER_WRITE);
+    bool swap = n_args > 2 && mp_obj_is_true(args[2]);
+
+    size_t pixels = src.len / 2;
+    if(dst.len < (pixels * 3 + 1) / 2) {
+        mp_raise_ValueError("destination too small");
+        return mp_const_none;
+    }
+    return mp_obj_new_int(pack_rgb444(src.buf, pixels, dst.buf, swap));
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(rgb565_to_rgb444_obj, 2, 3, rgb565_to_rgb444);
+
+static mp_obj_t rgb565_to_rgb666(size_t n_args, const mp_obj_t *args) {
+    mp_buffer_info_t src;
+    mp_buffer_info_t dst;
+    mp_get_buffer_raise(args[0], &src, MP_BUFFER_READ);
+    mp_get_buffer_raise(args[1], &dst, MP_BUFFER_WRITE);
+    bool swap = n_args > 2 && mp_obj_is_true(args[2]);
+
+    size_t pixels = src.len / 2;
+    if(dst.len < pixels * 3) {
+        mp_raise_ValueError("destination too small");
+        return mp_const_none;
+    }
+    return mp_obj_new_int(pack_rgb666(src.buf, pixels, dst.buf, swap));
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(rgb565_to_rgb666_obj, 2, 3, rgb565_to_rgb666);
+
+// view(offset=0, length=None), a memoryview of part of the blob, no copy.
+static mp_obj_t Blob_view(size_t n_args, const mp_obj_t *args) {
+    Blob_obj_t *self = MP_OBJ_TO_PTR(args[0]);
+    if(self->data == NULL) {
+        return mp_const_none;
+    }
+    mp_int_t offset = n_args > 1 ? mp_obj_get_int(args[1]) : 0;
+    mp_int_t length = (mp_int_t)self->size - offset;
+    if(n_args > 2 && args[2] != mp_const_none) {
+        length = mp_obj_get_int(args[2]);
+    }
+    if(offset < 0 || length < 0 || offset + length > (mp_int_t)self->size) {
+        mp_raise_ValueError("range out of the buffer");
+        return mp_const_none;
+    }
+
+    size_t typecode = BYTEARRAY_TYPECODE | MP_OBJ_ARRAY_TYPECODE_FLAG_RW;
+    return mp_obj_new_memoryview(typecode, length, (uint8_t*)self->data + offset);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(Blob_view_obj, 1, 3, Blob_view);
+
+// fill(byte, start=0, end=None), memset
+static mp_obj_t Blob_fill(size_t n_args, const mp_obj_t *args) {
+    size_t len;
+    uint8_t* data = get_range(args[0], n_args, args, 2, MP_BUFFER_WRITE, &len);
+    memset(data, mp_obj_get_int(args[1]) & 0xFF, len);
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(Blob_fill_obj, 2, 4, Blob_fill);
+
+// copy_from(src, offset=0), memcpy of a whole buffer into the blob at offset
+static mp_obj_t Blob_copy_from(size_t n_args, const mp_obj_t *args) {
+    Blob_obj_t *self = MP_OBJ_TO_PTR(args[0]);
+    mp_buffer_info_t src;
+    mp_get_buffer_raise(args[1], &src, MP_BUFFER_READ);
+    mp_int_t offset = n_args > 2 ? mp_obj_get_int(args[2]) : 0;
+    if(offset < 0 || offset + src.len > self->size) {
+        mp_raise_ValueError("blob too small");
+        return mp_const_none;
+    }
+    memmove((uint8_t*)self->data + offset, src.buf, src.len);
+    return mp_obj_new_int(src.len);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(Blob_copy_from_obj, 2, 3, Blob_copy_from);
+
+// heap_stats(spiram=False), free memory of the DMA-capable heap and the pool.
+static mp_obj_t blob_heap_stats(size_t n_args, const mp_obj_t *args) {
+    bool spiram = n_args > 0 && mp_obj_is_true(args[0]);
+    multi_heap_info_t info;
+    heap_caps_get_info(&info, pool_caps(spiram));
+    pool_stats_t stats;
+    pool_get_stats(spiram, &stats);
+
+    // share of the free memory not in the largest block, in percent
+    mp_int_t fragmentation = 0;
+    if(info.total_free_bytes > 0) {
+        fragmentation = 100 - (mp_int_t)(info.largest_free_block * 100 / info.total_free_bytes);
+    }
+
+    mp_obj_t dict = mp_obj_new_dict(8);
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_free), mp_obj_new_int_from_uint(info.total_free_bytes));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_largest), mp_obj_new_int_from_uint(info.largest_free_block));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_min_free), mp_obj_new_int_from_uint(info.minimum_free_bytes));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_allocated), mp_obj_new_int_from_uint(info.total_allocated_bytes));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_fragmentation), mp_obj_new_int(fragmentation));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_pool_blocks), mp_obj_new_int_from_uint(stats.cached_blocks));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_pool_bytes), mp_obj_new_int_from_uint(stats.cached_bytes));
+    mp_obj_dict_store(dict, MP_OBJ_NEW_QSTR(MP_QSTR_pool_hits), mp_obj_new_int_from_uint(stats.hits));
+    return dict;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(blob_heap_stats_obj, 0, 1, blob_heap_stats);
+
+// Return the memory cached by the pool to the heap.
+static mp_obj_t blob_pool_trim(void) {
+    pool_trim();
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_0(blob_pool_trim_obj, blob_pool_trim);
+
+
 // Collection of all static methods and locals of the new type.
+// The buffer functions double as methods, self being the buffer.
 static const mp_rom_map_elem_t Blob_locals_dict_table[] = {
     { MP_ROM_QSTR(MP_QSTR_malloc_dma), MP_ROM_PTR(&Blob_malloc_dma_obj) },
+    { MP_ROM_QSTR(MP_QSTR_malloc_pool), MP_ROM_PTR(&Blob_malloc_pool_obj) },
     { MP_ROM_QSTR(MP_QSTR_free), MP_ROM_PTR(&Blob_free_obj) },
     { MP_ROM_QSTR(MP_QSTR_memoryview), MP_ROM_PTR(&Blob_memoryview_obj) },
     { MP_ROM_QSTR(MP_QSTR_mv), MP_ROM_PTR(&Blob_memoryview_obj) },
     { MP_ROM_QSTR(MP_QSTR_bytearray), MP_ROM_PTR(&Blob_bytearray_obj) },
     { MP_ROM_QSTR(MP_QSTR_bs), MP_ROM_PTR(&Blob_bytearray_obj) },
+    { MP_ROM_QSTR(MP_QSTR_view), MP_ROM_PTR(&Blob_view_obj) },
+    { MP_ROM_QSTR(MP_QSTR_fill), MP_ROM_PTR(&Blob_fill_obj) },
+    { MP_ROM_QSTR(MP_QSTR_copy_from), MP_ROM_PTR(&Blob_copy_from_obj) },
+    { MP_ROM_QSTR(MP_QSTR_swap16), MP_ROM_PTR(&blob_swap16_obj) },
+    { MP_ROM_QSTR(MP_QSTR_fill16), MP_ROM_PTR(&blob_fill16_obj) },
+    { MP_ROM_QSTR(MP_QSTR_copy), MP_ROM_PTR(&blob_copy_obj) },
+    { MP_ROM_QSTR(MP_QSTR_convert), MP_ROM_PTR(&blob_convert_obj) },
 };
 static MP_DEFINE_CONST_DICT(Blob_locals_dict, Blob_locals_dict_table);
 
@@ -153,6 +434,17 @@ MP_DEFINE_CONST_OBJ_TYPE(
 static const mp_rom_map_elem_t blob_globals_table[] = {
     { MP_ROM_QSTR(MP_QSTR___name__), MP_ROM_QSTR(MP_QSTR_blob) },
     { MP_ROM_QSTR(MP_QSTR_Blob), MP_ROM_PTR(&type_Blob) },
+    { MP_ROM_QSTR(MP_QSTR_RGB444), MP_ROM_INT(FORMAT_RGB444) },
+    { MP_ROM_QSTR(MP_QSTR_RGB565), MP_ROM_INT(FORMAT_RGB565) },
+    { MP_ROM_QSTR(MP_QSTR_RGB666), MP_ROM_INT(FORMAT_RGB666) },
+    { MP_ROM_QSTR(MP_QSTR_swap16), MP_ROM_PTR(&blob_swap16_obj) },
+    { MP_ROM_QSTR(MP_QSTR_fill16), MP_ROM_PTR(&blob_fill16_obj) },
+    { MP_ROM_QSTR(MP_QSTR_copy), MP_ROM_PTR(&blob_copy_obj) },
+    { MP_ROM_QSTR(MP_QSTR_convert), MP_ROM_PTR(&blob_convert_obj) },
+    { MP_ROM_QSTR(MP_QSTR_rgb565_to_rgb444), MP_ROM_PTR(&rgb565_to_rgb444_obj) },
+    { MP_ROM_QSTR(MP_QSTR_rgb565_to_rgb666), MP_ROM_PTR(&rgb565_to_rgb666_obj) },
+    { MP_ROM_QSTR(MP_QSTR_heap_stats), MP_ROM_PTR(&blob_heap_stats_obj) },
+    { MP_ROM_QSTR(MP_QSTR_pool_trim), MP_ROM_PTR(&blob_pool_trim_obj) },
 };
 
 static MP_DEFINE_CONST_DICT(blob_globals, blob_globals_table);
@@ -3,14 +3,25 @@
 
 #include "py/obj.h"
 
+#include "pixel.h"
+#include "pool.h"
+
 #define CANNOT_ALLOCATE_MEMORY 12
 
+// pixel formats of convert(), in bits per pixel
+#define FORMAT_RGB444 12
+#define FORMAT_RGB565 16
+#define FORMAT_RGB666 18
+
 // This structure represents some heap-allocated memory outside of gc
 typedef struct _Blob_obj_t {
     // All objects start with the base.
     mp_obj_base_t base;
     size_t size;
     void* data;
+    // size class in the pool, POOL_NONE for plain heap_caps allocations
+    int pool;
+    bool spiram;
 } Blob_obj_t;
 
 extern const mp_obj_type_t type_Blob;
@@ -0,0 +1,94 @@
+#include "pixel.h"
+
+// Read one rgb565 pixel, big endian (as sent to the panel) unless swap.
+static inline uint16_t read_rgb565(const uint8_t* src, bool swap) {
+    if(swap) {
+        return (uint16_t)(src[1] << 8 | src[0]);
+    }
+    return (uint16_t)(src[0] << 8 | src[1]);
+}
+
+// Pack rgb565 into rgb444, two pixels in three bytes: RG BR GB.
+size_t pack_rgb444(const uint8_t* in, size_t pixels, uint8_t* out, bool swap) {
+    size_t i = 0;
+    for(; i + 1 < pixels; i += 2) {
+        uint16_t a = read_rgb565(in, swap);
+        uint16_t b = read_rgb565(in + 2, swap);
+        in += 4;
+        out[0] = (uint8_t)(((a >> 8) & 0xF0) | ((a >> 7) & 0x0F));
+        out[1] = (uint8_t)(((a << 3) & 0xF0) | ((b >> 12) & 0x0F));
+        out[2] = (uint8_t)(((b >> 3) & 0xF0) | ((b >> 1) & 0x0F));
+        out += 3;
+    }
+    if(i < pixels) {
+        // odd count, the trailing nibble is padding
+        uint16_t a = read_rgb565(in, swap);
+        out[0] = (uint8_t)(((a >> 8) & 0xF0) | ((a >> 7) & 0x0F));
+        out[1] = (uint8_t)((a << 3) & 0xF0);
+    }
+    return (pixels * 3 + 1) / 2;
+}
+
+// Expand rgb565 into rgb666, one byte per component in the upper six bits.
+size_t pack_rgb666(const uint8_t* in, size_t pixels, uint8_t* out, bool swap) {
+    for(size_t i = 0; i < pixels; i++) {
+        uint16_t a = read_rgb565(in, swap);
+        in += 2;
+        uint8_t r = (a >> 11) & 0x1F;
+        uint8_t b = a & 0x1F;
+        out[0] = (uint8_t)((r << 3) | (r >> 2));
+        out[1] = (uint8_t)((a >> 3) & 0xFC);
+        out[2] = (uint8_t)((b << 3) | (b >> 2));
+        out += 3;
+    }
+    return pixels * 3;
+}
+
+// Swap the bytes of every 16-bit word, a word at a time where aligned.
+void swap16(uint8_t* data, size_t len) {
+    if(((uintptr_t)data & 1) == 0) {
+        if(((uintptr_t)data & 2) && len >= 2) {
+            uint8_t t = data[0];
+            data[0] = data[1];
+            data[1] = t;
+            data += 2;
+            len -= 2;
+        }
+        uint32_t* words = (uint32_t*)data;
+        size_t n = len / 4;
+        for(size_t i = 0; i < n; i++) {
+            uint32_t x = words[i];
+            words[i] = ((x & 0x00FF00FFu) << 8) | ((x >> 8) & 0x00FF00FFu);
+        }
+        data += n * 4;
+        len -= n * 4;
+    }
+    for(size_t i = 0; i + 1 < len; i += 2) {
+        uint8_t t = data[i];
+        data[i] = data[i + 1];
+        data[i + 1] = t;
+    }
+}
+
+// Fill with a 16-bit value in native (little endian) order.
+void fill16(uint8_t* data, size_t len, uint16_t value) {
+    if(((uintptr_t)data & 1) == 0) {
+        if(((uintptr_t)data & 2) && len >= 2) {
+            *(uint16_t*)data = value;
+            data += 2;
+            len -= 2;
+        }
+        uint32_t* words = (uint32_t*)data;
+        uint32_t pattern = (uint32_t)value << 16 | value;
+        size_t n = len / 4;
+        for(size_t i = 0; i < n; i++) {
+            words[i] = pattern;
+        }
+        data += n * 4;
+        len -= n * 4;
+    }
+    for(size_t i = 0; i + 1 < len; i += 2) {
+        data[i] = value & 0xFF;
+        data[i + 1] = value >> 8;
+    }
+}
@@ -0,0 +1,14 @@
+#ifndef _MP_BLOB_PIXEL_HEADER
+#define _MP_BLOB_PIXEL_HEADER
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// Pixel packers of the blob module, plain C so they also build on the host.
+size_t pack_rgb444(const uint8_t* in, size_t pixels, uint8_t* out, bool swap);
+size_t pack_rgb666(const uint8_t* in, size_t pixels, uint8_t* out, bool swap);
+void swap16(uint8_t* data, size_t len);
+void fill16(uint8_t* data, size_t len, uint16_t value);
+
+#endif
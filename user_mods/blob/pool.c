@@ -0,0 +1,92 @@
+#include "pool.h"
+
+// Free blocks are chained through their own memory.
+typedef struct _pool_block_t {
+    struct _pool_block_t* next;
+} pool_block_t;
+
+static pool_block_t* free_lists[2][POOL_CLASSES];
+static pool_stats_t pool_stats[2];
+
+
+uint32_t pool_caps(bool spiram) {
+    uint32_t caps = MALLOC_CAP_8BIT | MALLOC_CAP_DMA;
+    if(spiram) {
+        caps |= MALLOC_CAP_SPIRAM;
+    } else {
+        caps |= MALLOC_CAP_INTERNAL;
+    }
+    return caps;
+}
+
+// Smallest class holding size, -1 when it does not fit any.
+static int pool_class(size_t size) {
+    for(int cls = 0; cls < POOL_CLASSES; cls++) {
+        if(size <= ((size_t)1 << (POOL_MIN_SHIFT + cls))) {
+            return cls;
+        }
+    }
+    return -1;
+}
+
+void* pool_alloc(size_t size, bool spiram, size_t align, int* cls) {
+    pool_stats_t* stats = &pool_stats[spiram];
+    if(align < sizeof(void*)) {
+        align = sizeof(void*);
+    }
+    int c = align <= POOL_ALIGN ? pool_class(size) : -1;
+    if(c < 0) {
+        *cls = POOL_DIRECT;
+        stats->misses++;
+        return heap_caps_aligned_alloc(align, size, pool_caps(spiram));
+    }
+
+    *cls = c;
+    size_t block_size = (size_t)1 << (POOL_MIN_SHIFT + c);
+    pool_block_t* block = free_lists[spiram][c];
+    if(block != NULL) {
+        free_lists[spiram][c] = block->next;
+        stats->cached_blocks--;
+        stats->cached_bytes -= block_size;
+        stats->hits++;
+        return block;
+    }
+    stats->misses++;
+    return heap_caps_aligned_alloc(POOL_ALIGN, block_size, pool_caps(spiram));
+}
+
+void pool_free(void* data, bool spiram, int cls) {
+    if(data == NULL) {
+        return;
+    }
+    if(cls < 0 || cls >= POOL_CLASSES) {
+        heap_caps_free(data);
+        return;
+    }
+    pool_block_t* block = data;
+    block->next = free_lists[spiram][cls];
+    free_lists[spiram][cls] = block;
+    pool_stats[spiram].cached_blocks++;
+    pool_stats[spiram].cached_bytes += (size_t)1 << (POOL_MIN_SHIFT + cls);
+}
+
+// Give every cached block back to the heap.
+void pool_trim(void) {
+    for(int spiram = 0; spiram < 2; spiram++) {
+        for(int cls = 0; cls < POOL_CLASSES; cls++) {
+            pool_block_t* block = free_lists[spiram][cls];
+            while(block != NULL) {
+                pool_block_t* next = block->next;
+                heap_caps_free(block);
+                block = next;
+            }
+            free_lists[spiram][cls] = NULL;
+        }
+        pool_stats[spiram].cached_blocks = 0;
+        pool_stats[spiram].cached_bytes = 0;
+    }
+}
+
+void pool_get_stats(bool spiram, pool_stats_t* stats) {
+    *stats = pool_stats[spiram];
+}
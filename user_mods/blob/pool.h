@@ -0,0 +1,67 @@
+#ifndef _MP_BLOB_POOL_HEADER
+#define _MP_BLOB_POOL_HEADER
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+#ifdef ESP_PLATFORM
+#include "esp_heap_caps.h"
+#else
+// Host build: plain malloc stands in for the capability-aware heap.
+#include <stdlib.h>
+#include <string.h>
+
+#define MALLOC_CAP_DMA (1 << 3)
+#define MALLOC_CAP_8BIT (1 << 2)
+#define MALLOC_CAP_SPIRAM (1 << 10)
+#define MALLOC_CAP_INTERNAL (1 << 11)
+
+typedef struct {
+    size_t total_free_bytes;
+    size_t total_allocated_bytes;
+    size_t largest_free_block;
+    size_t minimum_free_bytes;
+    size_t allocated_blocks;
+    size_t free_blocks;
+    size_t total_blocks;
+} multi_heap_info_t;
+
+static inline void* heap_caps_aligned_alloc(size_t alignment, size_t size, uint32_t caps) {
+    (void)caps;
+    return aligned_alloc(alignment, (size + alignment - 1) / alignment * alignment);
+}
+
+static inline void heap_caps_free(void* ptr) {
+    free(ptr);
+}
+
+static inline void heap_caps_get_info(multi_heap_info_t* info, uint32_t caps) {
+    (void)caps;
+    memset(info, 0, sizeof(*info));
+}
+#endif
+
+// Fixed size classes, powers of two from 256 bytes to 64 KiB.
+#define POOL_MIN_SHIFT 8
+#define POOL_CLASSES 9
+// Every pooled block is aligned to this, larger alignments bypass the pool.
+#define POOL_ALIGN 64
+// Blob not from the pool / from the pool but too large or aligned to be cached.
+#define POOL_NONE (-2)
+#define POOL_DIRECT (-1)
+
+typedef struct _pool_stats_t {
+    size_t cached_blocks;
+    size_t cached_bytes;
+    size_t hits;
+    size_t misses;
+} pool_stats_t;
+
+uint32_t pool_caps(bool spiram);
+void* pool_alloc(size_t size, bool spiram, size_t align, int* cls);
+void pool_free(void* data, bool spiram, int cls);
+void pool_trim(void);
+void pool_get_stats(bool spiram, pool_stats_t* stats);
+
+#endif
@@ -0,0 +1,357 @@
+#include <string.h>
+
+// Include MicroPython API.
+#include "py/runtime.h"
+#include "py/obj.h"
+#include "py/mphal.h"
+#include "py/mperrno.h"
+
+#include "driver/gpio.h"
+#include "esp_timer.h"
+#include "driver/spi_master.h"
+
+#include "lcd_bus.h"
+
+// Commands and short parameters fit into the transaction itself.
+#define LCD_BUS_TXDATA_SIZE 4
+
+// Bus that currently owns SPI2_HOST / SPI3_HOST, cleared by its deinit. The
+// finaliser runs on soft reset, so a new SPIBus finds the host free again.
+static SPIBus_obj_t* lcd_bus_owner[2];
+
+
+// Drive dc right before a transaction starts.
+static void IRAM_ATTR lcd_bus_pre_cb(spi_transaction_t *t) {
+    lcd_trans_t* lt = (lcd_trans_t*)t->user;
+    gpio_set_level(lt->bus->dc, lt->dc);
+}
+
+// Called from the SPI ISR, the last chunk of a color transfer carries the callback.
+static void IRAM_ATTR lcd_bus_post_cb(spi_transaction_t *t) {
+    lcd_trans_t* lt = (lcd_trans_t*)t->user;
+    if(lt->callback == MP_OBJ_NULL) {
+        return;
+    }
+    SPIBus_obj_t* self = lt->bus;
+    portENTER_CRITICAL_ISR(&self->lock);
+    self->pending--;
+    self->done_us = esp_timer_get_time();
+    portEXIT_CRITICAL_ISR(&self->lock);
+    if(lt->callback != mp_const_none) {
+        mp_sched_schedule(lt->callback, MP_OBJ_FROM_PTR(self));
+        // like machine.Pin irqs, run it without waiting for the next tick
+        mp_hal_wake_main_task_from_isr();
+    }
+}
+
+// Collect the oldest queued transaction and release its slot.
+static void lcd_bus_reap(SPIBus_obj_t* self) {
+    spi_transaction_t* rt;
+    check_esp_err(spi_device_get_trans_result(self->spi, &rt, portMAX_DELAY));
+    lcd_trans_t* lt = (lcd_trans_t*)rt->user;
+    lt->callback = MP_OBJ_NULL;
+    lt->data = MP_OBJ_NULL;
+    self->queued--;
+}
+
+static void lcd_bus_wait_all(SPIBus_obj_t* self) {
+    while(self->queued > 0) {
+        lcd_bus_reap(self);
+    }
+}
+
+static void lcd_bus_check(SPIBus_obj_t* self) {
+    if(self->spi == NULL) {
+        mp_raise_OSError(MP_ENODEV);
+    }
+}
+
+// Take the next slot of the ring, waiting for the oldest transaction if all are in use.
+static lcd_trans_t* lcd_bus_next_slot(SPIBus_obj_t* self) {
+    if(self->queued == LCD_BUS_QUEUE_DEPTH) {
+        lcd_bus_reap(self);
+    }
+    lcd_trans_t* lt = &self->trans[self->head];
+    self->head = (self->head + 1) % LCD_BUS_QUEUE_DEPTH;
+    memset(&lt->t, 0, sizeof(spi_transaction_t));
+    lt->t.user = lt;
+    lt->callback = MP_OBJ_NULL;
+    lt->data = MP_OBJ_NULL;
+    return lt;
+}
+
+static void lcd_bus_queue(SPIBus_obj_t* self, lcd_trans_t* lt) {
+    check_esp_err(spi_device_queue_trans(self->spi, &lt->t, portMAX_DELAY));
+    self->queued++;
+}
+
+// Queue a command or a short parameter block, copied into the transaction.
+static void lcd_bus_queue_small(SPIBus_obj_t* self, uint32_t dc, const uint8_t* data, size_t len) {
+    lcd_trans_t* lt = lcd_bus_next_slot(self);
+    lt->dc = dc;
+    lt->t.flags = SPI_TRANS_USE_TXDATA;
+    lt->t.length = len * 8;
+    memcpy(lt->t.tx_data, data, len);
+    lcd_bus_queue(self, lt);
+}
+
+// Send a longer parameter block synchronously.
+static void lcd_bus_polling(SPIBus_obj_t* self, uint32_t dc, const uint8_t* data, size_t len) {
+    lcd_trans_t lt = {0};
+    lt.bus = self;
+    lt.dc = dc;
+    lt.callback = MP_OBJ_NULL;
+    lt.t.user = &lt;
+    lt.t.length = len * 8;
+    lt.t.tx_buffer = data;
+    lcd_bus_wait_all(self);
+    check_esp_err(spi_device_polling_transmit(self->spi, &lt.t));
+}
+
+
+// Wait for the queue, then give the device and the host back to the driver.
+static mp_obj_t SPIBus_deinit(mp_obj_t self_in) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(self_in);
+    if(self->spi != NULL) {
+        lcd_bus_wait_all(self);
+        spi_bus_remove_device(self->spi);
+        spi_bus_free(self->host);
+        self->spi = NULL;
+    }
+    if(lcd_bus_owner[self->host - SPI2_HOST] == self) {
+        lcd_bus_owner[self->host - SPI2_HOST] = NULL;
+    }
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_1(SPIBus_deinit_obj, SPIBus_deinit);
+
+
+// Constructor of SPIBus class.
+static mp_obj_t SPIBus_make_new(const mp_obj_type_t *type, size_t n_args, size_t n_kw, const mp_obj_t *all_args) {
+    enum { ARG_host, ARG_sck, ARG_mosi, ARG_dc, ARG_cs, ARG_freq, ARG_max_transfer };
+    static const mp_arg_t allowed_args[] = {
+        { MP_QSTR_host, MP_ARG_REQUIRED | MP_ARG_INT, {.u_int = 1} },
+        { MP_QSTR_sck, MP_ARG_KW_ONLY | MP_ARG_REQUIRED | MP_ARG_INT, {.u_int = -1} },
+        { MP_QSTR_mosi, MP_ARG_KW_ONLY | MP_ARG_REQUIRED | MP_ARG_INT, {.u_int = -1} },
+        { MP_QSTR_dc, MP_ARG_KW_ONLY | MP_ARG_REQUIRED | MP_ARG_INT, {.u_int = -1} },
+        { MP_QSTR_cs, MP_ARG_KW_ONLY | MP_ARG_INT, {.u_int = -1} },
+        { MP_QSTR_freq, MP_ARG_KW_ONLY | MP_ARG_INT, {.u_int = 20000000} },
+        { MP_QSTR_max_transfer, MP_ARG_KW_ONLY | MP_ARG_INT, {.u_int = 32768} },
+    };
+    mp_arg_val_t args[MP_ARRAY_SIZE(allowed_args)];
+    mp_arg_parse_all_kw_array(n_args, n_kw, all_args, MP_ARRAY_SIZE(allowed_args), allowed_args, args);
+
+    // same numbering as machine.SPI
+    spi_host_device_t host;
+    if(args[ARG_host].u_int == 1) {
+        host = SPI2_HOST;
+    } else if(args[ARG_host].u_int == 2) {
+        host = SPI3_HOST;
+    } else {
+        mp_raise_ValueError("host should be 1 or 2");
+        return mp_const_none;
+    }
+    if(args[ARG_max_transfer].u_int <= 0) {
+        mp_raise_ValueError("max_transfer should be positive");
+        return mp_const_none;
+    }
+
+    // like machine.SPI, a new bus on a host replaces the previous one
+    SPIBus_obj_t* owner = lcd_bus_owner[host - SPI2_HOST];
+    if(owner != NULL) {
+        SPIBus_deinit(MP_OBJ_FROM_PTR(owner));
+    }
+
+    SPIBus_obj_t* self = mp_obj_malloc_with_finaliser(SPIBus_obj_t, type);
+    self->host = host;
+    self->spi = NULL;
+    self->dc = args[ARG_dc].u_int;
+    self->max_transfer = (size_t)args[ARG_max_transfer].u_int;
+    portMUX_INITIALIZE(&self->lock);
+    self->head = 0;
+    self->queued = 0;
+    self->pending = 0;
+    self->done_us = 0;
+    for(size_t i = 0; i < LCD_BUS_QUEUE_DEPTH; i++) {
+        self->trans[i].bus = self;
+        self->trans[i].callback = MP_OBJ_NULL;
+        self->trans[i].data = MP_OBJ_NULL;
+    }
+
+    gpio_reset_pin(self->dc);
+    gpio_set_direction(self->dc, GPIO_MODE_OUTPUT);
+
+    spi_bus_config_t bus_config = {
+        .sclk_io_num = args[ARG_sck].u_int,
+        .mosi_io_num = args[ARG_mosi].u_int,
+        .miso_io_num = -1,
+        .quadwp_io_num = -1,
+        .quadhd_io_num = -1,
+        .max_transfer_sz = self->max_transfer,
+    };
+    esp_err_t err = spi_bus_initialize(host, &bus_config, SPI_DMA_CH_AUTO);
+    if(err == ESP_ERR_INVALID_STATE && spi_bus_free(host) == ESP_OK) {
+        // left initialised without an owner, e.g. by a reset that skipped the finaliser
+        err = spi_bus_initialize(host, &bus_config, SPI_DMA_CH_AUTO);
+    }
+    check_esp_err(err);
+
+    spi_device_interface_config_t device_config = {
+        .clock_speed_hz = args[ARG_freq].u_int,
+        .mode = 0,
+        .spics_io_num = args[ARG_cs].u_int,
+        .queue_size = LCD_BUS_QUEUE_DEPTH,
+        .pre_cb = lcd_bus_pre_cb,
+        .post_cb = lcd_bus_post_cb,
+    };
+    err = spi_bus_add_device(host, &device_config, &self->spi);
+    if(err != ESP_OK) {
+        self->spi = NULL;
+        spi_bus_free(host);
+        check_esp_err(err);
+    }
+    lcd_bus_owner[host - SPI2_HOST] = self;
+    return MP_OBJ_FROM_PTR(self);
+}
+
+// Send a command with optional parameters.
+static mp_obj_t SPIBus_tx_param(size_t n_args, const mp_obj_t *args) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(args[0]);
+    lcd_bus_check(self);
+    uint8_t cmd = mp_obj_get_int(args[1]);
+    lcd_bus_queue_small(self, 0, &cmd, 1);
+    if(n_args < 3 || args[2] == mp_const_none) {
+        return mp_const_none;
+    }
+    mp_buffer_info_t bufinfo;
+    mp_get_buffer_raise(args[2], &bufinfo, MP_BUFFER_READ);
+    if(bufinfo.len == 0) {
+        return mp_const_none;
+    }
+    if(bufinfo.len <= LCD_BUS_TXDATA_SIZE) {
+        lcd_bus_queue_small(self, 1, bufinfo.buf, bufinfo.len);
+    } else {
+        lcd_bus_polling(self, 1, bufinfo.buf, bufinfo.len);
+    }
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(SPIBus_tx_param_obj, 2, 3, SPIBus_tx_param);
+
+// Queue pixel data without waiting, cmd < 0 skips the command phase.
+// callback(bus) is scheduled once the data has been sent.
+static mp_obj_t SPIBus_tx_color(size_t n_args, const mp_obj_t *args) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(args[0]);
+    lcd_bus_check(self);
+    mp_int_t cmd = mp_obj_get_int(args[1]);
+    mp_obj_t data = args[2];
+    mp_obj_t callback = n_args > 3 ? args[3] : mp_const_none;
+
+    mp_buffer_info_t bufinfo;
+    mp_get_buffer_raise(data, &bufinfo, MP_BUFFER_READ);
+
+    if(cmd >= 0) {
+        uint8_t c = cmd;
+        lcd_bus_queue_small(self, 0, &c, 1);
+    }
+    if(bufinfo.len == 0) {
+        self->done_us = esp_timer_get_time();
+        if(callback != mp_const_none) {
+            mp_sched_schedule(callback, MP_OBJ_FROM_PTR(self));
+        }
+        return mp_const_none;
+    }
+
+    portENTER_CRITICAL(&self->lock);
+    self->pending++;
+    portEXIT_CRITICAL(&self->lock);
+
+    const uint8_t* buf = bufinfo.buf;
+    size_t remaining = bufinfo.len;
+    while(remaining > 0) {
+        size_t len = remaining > self->max_transfer ? self->max_transfer : remaining;
+        lcd_trans_t* lt = lcd_bus_next_slot(self);
+        lt->dc = 1;
+        lt->t.length = len * 8;
+        lt->t.tx_buffer = buf;
+        lt->data = data;
+        buf += len;
+        remaining -= len;
+        if(remaining == 0) {
+            lt->callback = callback;
+        }
+        lcd_bus_queue(self, lt);
+    }
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(SPIBus_tx_color_obj, 3, 4, SPIBus_tx_color);
+
+// Block until every queued transaction is done.
+static mp_obj_t SPIBus_wait(mp_obj_t self_in) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(self_in);
+    lcd_bus_wait_all(self);
+    return mp_const_none;
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_1(SPIBus_wait_obj, SPIBus_wait);
+
+static mp_obj_t SPIBus_busy(mp_obj_t self_in) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(self_in);
+    return mp_obj_new_bool(self->pending > 0);
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_1(SPIBus_busy_obj, SPIBus_busy);
+
+// When the last color transfer finished, on the time.ticks_us() clock.
+static mp_obj_t SPIBus_done_us(mp_obj_t self_in) {
+    SPIBus_obj_t* self = MP_OBJ_TO_PTR(self_in);
+    portENTER_CRITICAL(&self->lock);
+    int64_t done = self->done_us;
+    portEXIT_CRITICAL(&self->lock);
+    return MP_OBJ_NEW_SMALL_INT(done & (MICROPY_PY_TIME_TICKS_PERIOD - 1));
+}
+
+static MP_DEFINE_CONST_FUN_OBJ_1(SPIBus_done_us_obj, SPIBus_done_us);
+
+// Collection of all static methods and locals of the new type.
+static const mp_rom_map_elem_t SPIBus_locals_dict_table[] = {
+    { MP_ROM_QSTR(MP_QSTR_tx_param), MP_ROM_PTR(&SPIBus_tx_param_obj) },
+    { MP_ROM_QSTR(MP_QSTR_tx_color), MP_ROM_PTR(&SPIBus_tx_color_obj) },
+    { MP_ROM_QSTR(MP_QSTR_wait), MP_ROM_PTR(&SPIBus_wait_obj) },
+    { MP_ROM_QSTR(MP_QSTR_busy), MP_ROM_PTR(&SPIBus_busy_obj) },
+    { MP_ROM_QSTR(MP_QSTR_done_us), MP_ROM_PTR(&SPIBus_done_us_obj) },
+    { MP_ROM_QSTR(MP_QSTR_deinit), MP_ROM_PTR(&SPIBus_deinit_obj) },
+    { MP_ROM_QSTR(MP_QSTR___del__), MP_ROM_PTR(&SPIBus_deinit_obj) },
+};
+static MP_DEFINE_CONST_DICT(SPIBus_locals_dict, SPIBus_locals_dict_table);
+
+
+// This defines the type_SPIBus object.
+MP_DEFINE_CONST_OBJ_TYPE(
+    type_SPIBus,
+    MP_QSTR_SPIBus,
+    MP_TYPE_FLAG_NONE,
+    make_new, SPIBus_make_new,
+    locals_dict, &SPIBus_locals_dict
+);
+
+
+// Define the module attributes.
+static const mp_rom_map_elem_t lcd_bus_globals_table[] = {
+    { MP_ROM_QSTR(MP_QSTR___name__), MP_ROM_QSTR(MP_QSTR_lcd_bus) },
+    { MP_ROM_QSTR(MP_QSTR_SPIBus), MP_ROM_PTR(&type_SPIBus) },
+};
+
+static MP_DEFINE_CONST_DICT(lcd_bus_globals, lcd_bus_globals_table);
+
+
+// Define module object.
+const mp_obj_module_t lcd_bus_module = {
+    .base = { &mp_type_module },
+    .globals = (mp_obj_dict_t *)&lcd_bus_globals,
+};
+
+// Register the module to make it available in Python.
+MP_REGISTER_MODULE(MP_QSTR_lcd_bus, lcd_bus_module);
@@ -0,0 +1,45 @@
+#ifndef _MP_LCD_BUS_HEADER
+#define _MP_LCD_BUS_HEADER
+
+#include "py/obj.h"
+
+#include "freertos/FreeRTOS.h"
+#include "driver/spi_master.h"
+
+// Number of queued SPI transactions, a color transfer may use several.
+#define LCD_BUS_QUEUE_DEPTH 8
+
+struct _SPIBus_obj_t;
+
+// One queued transaction, the dc level is applied in the pre-transfer callback.
+typedef struct _lcd_trans_t {
+    spi_transaction_t t;
+    struct _SPIBus_obj_t* bus;
+    uint32_t dc;
+    // Scheduled with the bus as argument once the transfer is done, or none.
+    mp_obj_t callback;
+    // Keeps the transmitted buffer alive while it is on the wire.
+    mp_obj_t data;
+} lcd_trans_t;
+
+// An SPI bus with a dc line, transfers pixel data in the background.
+typedef struct _SPIBus_obj_t {
+    mp_obj_base_t base;
+    spi_host_device_t host;
+    spi_device_handle_t spi;
+    int dc;
+    size_t max_transfer;
+    portMUX_TYPE lock;
+    // ring of transaction slots, `queued` of them are still owned by the driver
+    lcd_trans_t trans[LCD_BUS_QUEUE_DEPTH];
+    size_t head;
+    size_t queued;
+    // color transfers not finished yet, decremented from the ISR
+    volatile size_t pending;
+    // esp_timer time of the last finished color transfer, set from the ISR
+    volatile int64_t done_us;
+} SPIBus_obj_t;
+
+extern const mp_obj_type_t type_SPIBus;
+
+#endif
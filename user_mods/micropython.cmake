@@ -2,6 +2,8 @@
 add_library(blob INTERFACE)
 target_sources(blob INTERFACE
     ${CMAKE_CURRENT_LIST_DIR}/blob/blob.c
+    ${CMAKE_CURRENT_LIST_DIR}/blob/pixel.c
+    ${CMAKE_CURRENT_LIST_DIR}/blob/pool.c
 )
 
 
@@ -10,10 +12,20 @@ target_include_directories(blob INTERFACE
     ${CMAKE_CURRENT_LIST_DIR}
 )
 
+# Library lcd_bus queues display transfers on the esp32 SPI master driver.
+add_library(lcd_bus INTERFACE)
+target_sources(lcd_bus INTERFACE
+    ${CMAKE_CURRENT_LIST_DIR}/lcd_bus/lcd_bus.c
+)
+
+target_include_directories(lcd_bus INTERFACE
+    ${CMAKE_CURRENT_LIST_DIR}
+)
+
 # LVGL
 add_library(my_lvgl INTERFACE)
 include(${CMAKE_CURRENT_LIST_DIR}/lvgl/lvgl.cmake)
 # ulab
 include(${CMAKE_CURRENT_LIST_DIR}/micropython-ulab/code/micropython.cmake)
 # Link our INTERFACE library to the usermod target.
-target_link_libraries(usermod INTERFACE blob my_lvgl)
+target_link_libraries(usermod INTERFACE blob lcd_bus my_lvgl)
@@ -2,3 +2,4 @@ from .st7796 import *
 from .board import *
 from .cst328 import *
 from .ui import*
+from .console import *
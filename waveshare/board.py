@@ -60,6 +60,7 @@ class Board:
 
         # i2c devices
         self.imu.init()
+        self.imu.attach_irq(self.imu_init1, self.imu_init2)
 
     def deinit(self):
         self.display.deinit()
@@ -68,4 +69,5 @@ class Board:
         return self.display.blk(value)
 
     def read_imu(self):
-        return self.imu.read_accelerometer(), self.imu.read_gyproscope()
+        sample = self.imu.read_all()
+        return self.imu.read_accelerometer(sample=sample), self.imu.read_gyproscope(sample=sample)
@@ -0,0 +1,72 @@
+from framebuf import FrameBuffer, RGB565
+
+
+def swap_bytes(c):
+    return (c & 0xFF) << 8 | (c >> 8) & 0xFF
+
+
+class Console:
+    # a log view in the display's hardware scroll area: every line is drawn
+    # into one band, sent once, and scrolling is a single VSCRSADD
+    def __init__(self, display, top=0, height=None, fg=0xFFFF, bg=0, line_height=8, char_width=8) -> None:
+        self.display = display
+        self.width = display.width
+        if height is None:
+            height = display.height - top
+        self.lines = height // line_height
+        self.cols = self.width // char_width
+        self.top = top
+        self.height = self.lines * line_height
+        self.line_height = line_height
+        self.fg = fg
+        self.bg = bg
+        # the band is a native (little endian) FrameBuffer, fill_area() is not
+        if display.little_endian:
+            self.band_fg = fg
+            self.band_bg = bg
+        else:
+            self.band_fg = swap_bytes(fg)
+            self.band_bg = swap_bytes(bg)
+        self.buf = bytearray(self.width * line_height * 2)
+        self.band = FrameBuffer(self.buf, self.width, line_height, RGB565)
+        self.row = 0
+        self.full = False
+        display.define_scroll(top, self.height, display.height - top - self.height)
+        self.clear()
+
+    def clear(self):
+        self.display.fill_area(0, self.top, self.width, self.height, self.bg)
+        self.row = 0
+        self.full = False
+        self.display.scroll_start(self.top)
+
+    def write_line(self, text):
+        band = self.band
+        band.fill(self.band_bg)
+        band.text(text, 0, 0, self.band_fg)
+        y = self.top + self.row * self.line_height
+        self.display.block(0, y, self.width - 1, y + self.line_height - 1, self.buf)
+        self.row += 1
+        if self.row == self.lines:
+            self.row = 0
+            self.full = True
+        if self.full:
+            # the oldest line is the next one to be overwritten
+            self.display.scroll_start(self.top + self.row * self.line_height)
+
+    def write(self, text):
+        # '\n' ends a line, a trailing one does not start an empty line
+        if not text:
+            return
+        lines = text.split('\n')
+        if text[-1] == '\n':
+            lines.pop()
+        cols = self.cols
+        for line in lines:
+            if not line:
+                self.write_line(line)
+            for i in range(0, len(line), cols):
+                self.write_line(line[i:i + cols])
+
+    def deinit(self):
+        self.display.define_scroll(0, self.display.height, 0)
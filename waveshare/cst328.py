@@ -1,9 +1,10 @@
 from micropython import const
-from collections import namedtuple
 import struct
 import time
 from machine import Pin
 
+from .touch import TouchFrame
+
 
 REG_XY_RESOLUTION = 0xD1F8
 REG_VERIFY_BOOT = 0xD1FC
@@ -16,24 +17,31 @@ REG_NORMAL_MODE = 0xD109
 REG_TOUCH_FINGER1 = 0xD000
 REG_TOUCH_NUM = 0xD005
 REG_TOUCH_FINGER2 = 0xD007
-
-TouchPos = namedtuple("TouchPos", ("id", "x", "y", "c", "pressed"))
-TouchInfo = namedtuple("TouchInfo", ("num", "large", "points"))
+FINGER_LEN = const(5)
+MAX_POINTS = const(5)
 
 
-def parse_pos(bs):
-    data = struct.unpack('<BHHH', bs)
-    return TouchPos(*data)
+def finger_offset(index):
+    # finger 1 is followed by the touch number and a fixed 0xAB byte
+    if index == 0:
+        return 0
+    return REG_TOUCH_FINGER2 - REG_TOUCH_FINGER1 + (index - 1) * FINGER_LEN
 
 
 class CST328:
-    def __init__(self, i2c, addr, int, rst) -> None:
+    def __init__(self, i2c, addr, int, rst, max_points=MAX_POINTS) -> None:
         self.i2c = i2c
         self.addr = addr
         self.int = int
         self.rst = rst
         self.width = 0
         self.height = 0
+        # finger 1 .. max_points are one contiguous block starting at REG_TOUCH_FINGER1
+        self.max_points = max_points
+        self.frame = TouchFrame(max_points)
+        self.block = bytearray(max(finger_offset(max_points - 1) + FINGER_LEN, finger_offset(1)))
+        self.reg_buf = bytearray(2)
+        struct.pack_into(">H", self.reg_buf, 0, REG_TOUCH_FINGER1)
 
     def hard_reset(self):
         self.rst(1)
@@ -88,31 +96,32 @@ class CST328:
     def irq(self, func):
         self.int.irq(func, Pin.IRQ_RISING)
 
-    def read_one_finger(self, index):
-        if index == 0:
-            reg = REG_TOUCH_FINGER1
-        else:
-            reg = REG_TOUCH_FINGER2 + (index - 1) * 5
-        data = self.read_reg(reg, 5)
-        f_id = data[0] >> 4
-        pressed = data[0] & 0x0f == 0x06
-        b = data[3]
-        x = data[1] << 4 | (b >> 4)
-        y = data[2] << 4 | (b & 0x0F)
-        c = data[4]
-        return TouchPos(f_id, x, y, c, pressed)
-
     def read(self):
-        num = self.read_reg(REG_TOUCH_NUM, 1)[0] & 0x0F
+        # one burst over all finger slots, parsed into the shared frame
+        data = self.block
+        self.i2c.writeto(self.addr, self.reg_buf)
+        self.i2c.readfrom_into(self.addr, data)
+        num = data[REG_TOUCH_NUM - REG_TOUCH_FINGER1] & 0x0F
         if num == 0:
             return None
-        points = [self.read_one_finger(0)]
-        max_c = points[0].c
-        for i in range(1, num):
-            pos = self.read_one_finger(i)
-            max_c = max(pos.c, max_c)
-            points.append(pos)
-        return TouchInfo(num, max_c, points)
+        num = min(num, self.max_points)
+        frame = self.frame
+        max_c = 0
+        for i in range(num):
+            offset = finger_offset(i)
+            pt = frame.points[i]
+            b = data[offset]
+            pt.id = b >> 4
+            pt.pressed = b & 0x0F == 0x06
+            b = data[offset + 3]
+            pt.x = data[offset + 1] << 4 | (b >> 4)
+            pt.y = data[offset + 2] << 4 | (b & 0x0F)
+            pt.c = data[offset + 4]
+            if pt.c > max_c:
+                max_c = pt.c
+        frame.num = num
+        frame.large = max_c
+        return frame
 
     def set_debug_irq(self):
         def print_info(_):
@@ -0,0 +1,54 @@
+class DirtyRects:
+    # Inclusive [x0, y0, x1, y1] rectangles clipped to width x height.
+    # A new rectangle is merged into an existing one when their bounding
+    # box covers at most `slack` pixels more than the two of them, and
+    # everything collapses into one bounding box beyond max_rects.
+    def __init__(self, width, height, slack=None, max_rects=8) -> None:
+        self.width = width
+        self.height = height
+        self.slack = width * 8 if slack is None else slack
+        self.max_rects = max_rects
+        self.rects = []
+
+    def __len__(self):
+        return len(self.rects)
+
+    def clear(self):
+        self.rects.clear()
+
+    def add_all(self):
+        self.rects.clear()
+        self.rects.append([0, 0, self.width - 1, self.height - 1])
+
+    def add(self, x0, y0, x1, y1):
+        x0 = max(x0, 0)
+        y0 = max(y0, 0)
+        x1 = min(x1, self.width - 1)
+        y1 = min(y1, self.height - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        area = (x1 - x0 + 1) * (y1 - y0 + 1)
+        rects = self.rects
+        for r in rects:
+            ux0 = min(r[0], x0)
+            uy0 = min(r[1], y0)
+            ux1 = max(r[2], x1)
+            uy1 = max(r[3], y1)
+            union = (ux1 - ux0 + 1) * (uy1 - uy0 + 1)
+            if union <= (r[2] - r[0] + 1) * (r[3] - r[1] + 1) + area + self.slack:
+                r[0] = ux0
+                r[1] = uy0
+                r[2] = ux1
+                r[3] = uy1
+                return
+        if len(rects) < self.max_rects:
+            rects.append([x0, y0, x1, y1])
+            return
+        # too many pieces, send the bounding box instead
+        for r in rects:
+            x0 = min(r[0], x0)
+            y0 = min(r[1], y0)
+            x1 = max(r[2], x1)
+            y1 = max(r[3], y1)
+        rects.clear()
+        rects.append([x0, y0, x1, y1])
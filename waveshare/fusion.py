@@ -0,0 +1,111 @@
+from array import array
+from math import sqrt, atan2, asin
+
+SAMPLE_WIDTH = 6  # ax, ay, az, gx, gy, gz
+
+
+class Mahony:
+    # accelerometer in any unit (it is normalised), gyroscope in rad/s
+    def __init__(self, kp=1.0, ki=0.0, bias=(0.0, 0.0, 0.0)) -> None:
+        self.kp = kp
+        self.ki = ki
+        self.set_bias(*bias)
+        self.row = array('f', bytes(4 * SAMPLE_WIDTH))
+        self.reset()
+
+    def reset(self):
+        self.q = array('f', (1.0, 0.0, 0.0, 0.0))
+        self.integral = array('f', (0.0, 0.0, 0.0))
+
+    def set_bias(self, bx, by, bz):
+        # gyroscope bias, subtracted before integration
+        self.bias = array('f', (bx, by, bz))
+
+    def update(self, ax, ay, az, gx, gy, gz, dt):
+        row = self.row
+        row[0] = ax
+        row[1] = ay
+        row[2] = az
+        row[3] = gx
+        row[4] = gy
+        row[5] = gz
+        self.update_batch(row, dt)
+
+    def update_batch(self, block, dt):
+        # block: rows of (ax, ay, az, gx, gy, gz) sampled every dt seconds,
+        # e.g. QMI8658.scale_batch() of a FIFO batch
+        if hasattr(block, 'shape'):
+            block = block.flatten()
+        kp = self.kp
+        ki_dt = self.ki * dt
+        half_dt = 0.5 * dt
+        bx, by, bz = self.bias
+        ix, iy, iz = self.integral
+        q0, q1, q2, q3 = self.q
+
+        for i in range(0, len(block), SAMPLE_WIDTH):
+            ax = block[i]
+            ay = block[i + 1]
+            az = block[i + 2]
+            gx = block[i + 3] - bx
+            gy = block[i + 4] - by
+            gz = block[i + 5] - bz
+
+            norm = sqrt(ax * ax + ay * ay + az * az)
+            if norm > 0:
+                ax /= norm
+                ay /= norm
+                az /= norm
+                # gravity as seen by the current estimate
+                vx = 2 * (q1 * q3 - q0 * q2)
+                vy = 2 * (q0 * q1 + q2 * q3)
+                vz = q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3
+                ex = ay * vz - az * vy
+                ey = az * vx - ax * vz
+                ez = ax * vy - ay * vx
+                if ki_dt > 0:
+                    ix += ki_dt * ex
+                    iy += ki_dt * ey
+                    iz += ki_dt * ez
+                gx += kp * ex + ix
+                gy += kp * ey + iy
+                gz += kp * ez + iz
+
+            gx *= half_dt
+            gy *= half_dt
+            gz *= half_dt
+            qa = q0
+            qb = q1
+            qc = q2
+            q0 += -qb * gx - qc * gy - q3 * gz
+            q1 += qa * gx + qc * gz - q3 * gy
+            q2 += qa * gy - qb * gz + q3 * gx
+            q3 += qa * gz + qb * gy - qc * gx
+
+            norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0 /= norm
+            q1 /= norm
+            q2 /= norm
+            q3 /= norm
+
+        q = self.q
+        q[0] = q0
+        q[1] = q1
+        q[2] = q2
+        q[3] = q3
+        integral = self.integral
+        integral[0] = ix
+        integral[1] = iy
+        integral[2] = iz
+        return q
+
+    def quaternion(self):
+        return tuple(self.q)
+
+    def euler(self):
+        # roll, pitch, yaw in rad
+        q0, q1, q2, q3 = self.q
+        roll = atan2(2 * (q0 * q1 + q2 * q3), 1 - 2 * (q1 * q1 + q2 * q2))
+        pitch = asin(max(-1.0, min(1.0, 2 * (q0 * q2 - q3 * q1))))
+        yaw = atan2(2 * (q0 * q3 + q1 * q2), 1 - 2 * (q2 * q2 + q3 * q3))
+        return roll, pitch, yaw
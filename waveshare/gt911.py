@@ -1,9 +1,10 @@
 from micropython import const
-from collections import namedtuple
 import struct
 import time
 from machine import Pin
 
+from .touch import TouchFrame
+
 
 GT911_REG_CMD = const(0x8040)
 GT911_CMD_RST = const(2)
@@ -17,21 +18,20 @@ GT911_PT_STEP = const(8)
 GT911_PT_NUM = const(5)
 
 
-TouchPos = namedtuple("TouchPos", ("id", "x", "y", "c"))
-TouchInfo = namedtuple("TouchInfo", ("num", "large", "points"))
-
-
-def parse_pos(bs):
-    data = struct.unpack('<BHHH', bs)
-    return TouchPos(*data)
-
-
 class GT911:
     def __init__(self, i2c, addr, int, rst) -> None:
         self.i2c = i2c
         self.addr = addr
         self.int = int
         self.rst = rst
+        # reusable buffers for the polling path
+        self.frame = TouchFrame(GT911_PT_NUM)
+        self.block = bytearray(GT911_PT_NUM * GT911_PT_STEP)
+        self.block_mv = memoryview(self.block)
+        self.status = bytearray(1)
+        self.reg_buf = bytearray(2)
+        self.clear_buf = bytearray(3)
+        struct.pack_into(">HB", self.clear_buf, 0, GT911_REG_TOUCH_NUM, 0)
 
     def hard_reset(self):
         self.rst(0)
@@ -78,6 +78,12 @@ class GT911:
         self.i2c.writeto(self.addr, reg)
         return self.i2c.readfrom(self.addr, size)
 
+    def read_reg_into(self, reg, buf):
+        struct.pack_into(">H", self.reg_buf, 0, reg)
+        self.i2c.writeto(self.addr, self.reg_buf)
+        self.i2c.readfrom_into(self.addr, buf)
+        return buf
+
     def write_reg(self, reg, data):
         bs = bytearray(2)
         reg = struct.pack_into(">H", bs, 0, reg)
@@ -90,17 +96,28 @@ class GT911:
         self.int.irq(func, Pin.IRQ_RISING)
 
     def read(self):
-        status = self.read_reg(GT911_REG_TOUCH_NUM, 1)[0]
+        status = self.read_reg_into(GT911_REG_TOUCH_NUM, self.status)[0]
         if not (status & 0b1000_0000):
             return None
-        large = status & 0b0100_0000
-        num = status & 0b0000_1111
-        points = []
-        for i in range(GT911_PT_NUM):
-            bs = self.read_reg(GT911_REG_TOUCH_PT1 + i * GT911_PT_STEP, 7)
-            points.append(parse_pos(bs))
-        self.write_reg(GT911_REG_TOUCH_NUM, 0)
-        return TouchInfo(num, large, points)
+        num = min(status & 0b0000_1111, GT911_PT_NUM)
+        frame = self.frame
+        if num:
+            # the points are contiguous, so read exactly the active ones
+            data = self.block
+            self.read_reg_into(GT911_REG_TOUCH_PT1, self.block_mv[:num * GT911_PT_STEP])
+            for i in range(num):
+                offset = i * GT911_PT_STEP
+                pt = frame.points[i]
+                pt.id = data[offset]
+                pt.x = data[offset + 1] | data[offset + 2] << 8
+                pt.y = data[offset + 3] | data[offset + 4] << 8
+                pt.c = data[offset + 5] | data[offset + 6] << 8
+                pt.pressed = True
+        frame.num = num
+        frame.large = status & 0b0100_0000
+        # the controller only refreshes the buffer after the status is cleared
+        self.i2c.writeto(self.addr, self.clear_buf)
+        return frame
 
     def set_debug_irq(self):
         def print_info(_):
@@ -19,29 +19,37 @@ class RegStructure:
         self.reg = reg
         self.pattern = pattern
         self.length = struct.calcsize(pattern)
+        # shared scratch buffer, decoded right after the burst read
+        self.buf = bytearray(self.length)
 
     def __get__(self, instance, owner):
         if instance is None:
             return self
-        bs = instance.read_reg(self.reg, self.length)
-        return struct.unpack(self.pattern, bs)
+        instance.read_reg_into(self.reg, self.buf)
+        return struct.unpack_from(self.pattern, self.buf)
 
 
 class I2CDevice:
     def __init__(self, i2c, addr) -> None:
         self.i2c =i2c
         self.addr = addr
+        self.byte_buf = bytearray(1)
 
     def read_byte(self, reg):
-        return self.i2c.readfrom_mem(self.addr, reg, 1)[0]
+        self.i2c.readfrom_mem_into(self.addr, reg, self.byte_buf)
+        return self.byte_buf[0]
+
+    def read_reg_into(self, reg, buf):
+        # one transaction, the device auto-increments the register address
+        self.i2c.readfrom_mem_into(self.addr, reg, buf)
+        return buf
 
     def read_reg(self, reg, length):
-        bs = bytearray()
-        for i in range(length):
-            bs.append(
-                self.read_byte(reg + i)
-            )
-        return bs
+        return self.read_reg_into(reg, bytearray(length))
+
+    def write_reg(self, reg, buf):
+        return self.i2c.writeto_mem(self.addr, reg, buf)
 
     def write_byte(self, reg, x):
-        return self.i2c.writeto_mem(self.addr, reg, bytearray([x]))
+        self.byte_buf[0] = x
+        return self.i2c.writeto_mem(self.addr, reg, self.byte_buf)
@@ -1,8 +1,16 @@
 from micropython import const
+from array import array
+from asyncio import sleep_ms, ThreadSafeFlag
+from machine import Pin
 import time
 
 from .i2c_device import I2CDevice, RegByte, RegStructure
 
+try:
+    from ulab import numpy as np
+except ImportError:
+    np = None
+
 QMI8658_ADDR = const(0x6A)
 QMI8658_ADDR2 = const(0x6B)
 
@@ -10,12 +18,67 @@ REG_WHO_AM_I = const(0x00)
 VAL_SENSOR_ID = const(0x05)
 
 REG_CTRL1 = const(0x02)  # power control
+CTRL1_ADDR_AI = const(0b0100_0000)  # register address auto increment
+CTRL1_INT2_EN = const(0b0001_0000)
+CTRL1_INT1_EN = const(0b0000_1000)
+CTRL1_FIFO_INT_SEL = const(0b0000_0100)  # 1: FIFO interrupt on INT1, 0: INT2
 REG_CTRL2 = const(0x03)  # accelerometer config
 REG_CTRL3 = const(0x04)  # gyroscope config
 REG_CTRL4 = const(0x05)
 REG_CTRL5 = const(0x06)
 REG_CTRL6 = const(0x07)
 REG_CTRL7 = const(0x08)  # enable sensor
+CTRL7_DRDY_DIS = const(0b0010_0000)  # data ready is signalled on INT2
+REG_CTRL8 = const(0x09)  # motion detection control
+CTRL8_ACTIVITY_INT_SEL = const(0b0100_0000)  # 1: motion events on INT1, 0: INT2
+CTRL8_NO_MOTION_EN = const(0b0000_0100)
+CTRL8_ANY_MOTION_EN = const(0b0000_0010)
+CTRL8_TAP_EN = const(0b0000_0001)
+REG_CTRL9 = const(0x0A)  # host command
+
+CTRL_CMD_ACK = const(0x00)
+CTRL_CMD_RST_FIFO = const(0x04)
+CTRL_CMD_REQ_FIFO = const(0x05)
+CTRL_CMD_WRITE_WOM_SETTING = const(0x08)
+CTRL_CMD_CONFIGURE_TAP = const(0x0C)
+CTRL_CMD_CONFIGURE_MOTION = const(0x0E)
+
+REG_CAL1_L = const(0x0B)  # CAL1_L .. CAL4_H carry the command parameters
+CAL_LEN = const(8)
+
+REG_FIFO_WTM_TH = const(0x13)
+REG_FIFO_CTRL = const(0x14)
+REG_FIFO_SMPL_CNT = const(0x15)
+REG_FIFO_STATUS = const(0x16)
+REG_FIFO_DATA = const(0x17)
+
+FIFO_RD_MODE = const(0b1000_0000)
+FIFO_MODE_BYPASS = const(0b00)
+FIFO_MODE_FIFO = const(0b01)
+FIFO_MODE_STREAM = const(0b10)
+FIFO_SIZE = {16: 0, 32: 1, 64: 2, 128: 3}
+FIFO_SAMPLE_WIDTH = const(6)  # ax, ay, az, gx, gy, gz
+
+REG_STATUSINT = const(0x2D)
+STATUSINT_CMD_DONE = const(0b1000_0000)
+REG_STATUS1 = const(0x2F)
+REG_TAP_STATUS = const(0x59)
+
+# STATUS1 bits, cleared on read
+MOTION_TAP = const(0b0000_0010)
+MOTION_WOM = const(0b0000_0100)
+MOTION_ANY = const(0b0010_0000)
+MOTION_NO = const(0b0100_0000)
+MOTION_SIGNIFICANT = const(0b1000_0000)
+MOTION_MASK = const(0b1110_0110)
+
+# MOTION_MODE_CTRL (CAL4_L of the first CTRL_CMD_CONFIGURE_MOTION)
+ANY_MOTION_X = const(0b0000_0001)
+ANY_MOTION_Y = const(0b0000_0010)
+ANY_MOTION_Z = const(0b0000_0100)
+NO_MOTION_X = const(0b0001_0000)
+NO_MOTION_Y = const(0b0010_0000)
+NO_MOTION_Z = const(0b0100_0000)
 
 REG_TEMP_L = const(0x33)
 REG_TEMP_H = const(0x34)
@@ -38,7 +101,18 @@ REG_RST = const(0x60)
 VAL_RST = const(0xB0)
 
 PATTERN_XYZ = const("<hhh")
+SAMPLE_LEN = const(7)  # temp, ax, ay, az, gx, gy, gz
+TEMP_SCALE = const(256)
 RESOLUTION = const(1 << (2 * 8))
+ODR_MASK = const(0b0000_1111)
+
+# nominal output data rate (Hz) -> aODR/gODR bits, see CTRL2/CTRL3
+ODR = {
+    8000: 0, 4000: 1, 2000: 2, 1000: 3, 500: 4,
+    250: 5, 125: 6, 62.5: 7, 31.25: 8,
+}
+# accelerometer only low power rates, used by wake on motion
+LOW_POWER_ODR = {128: 12, 21: 13, 11: 14, 3: 15}
 
 STANDARD_GRAVITY = const(9.80665)
 PI = const(3.1415926535897932)
@@ -49,10 +123,18 @@ class QMI8658(I2CDevice):
     who_am_i = RegByte(REG_WHO_AM_I)
     reg_reset = RegByte(REG_RST)
     reg_4d = RegByte(0x4D)
+    ctrl1 = RegByte(REG_CTRL1)
     acc_config = RegByte(REG_CTRL2)
     gyro_config = RegByte(REG_CTRL3)
 
     reg_enable = RegByte(REG_CTRL7)
+    ctrl8 = RegByte(REG_CTRL8)
+    ctrl9 = RegByte(REG_CTRL9)
+    status1 = RegByte(REG_STATUS1)
+    tap_status = RegByte(REG_TAP_STATUS)
+    status_int = RegByte(REG_STATUSINT)
+    fifo_watermark = RegByte(REG_FIFO_WTM_TH)
+    fifo_ctrl = RegByte(REG_FIFO_CTRL)
     acc_data = RegStructure(REG_AX_L, PATTERN_XYZ)
     gyro_data = RegStructure(REG_GX_L, PATTERN_XYZ)
 
@@ -65,10 +147,27 @@ class QMI8658(I2CDevice):
 
         self.acc_scale = 1
         self.gyro_scale = 1
+        self.sample = array('h', bytes(2 * SAMPLE_LEN))
+        self.acc_raw = array('h', bytes(6))
+        self.gyro_raw = array('h', bytes(6))
+        self.odr = 8000
+        self.fifo_config = FIFO_MODE_BYPASS
+        self.fifo_period_ms = 0
+        self.fifo_count = bytearray(2)
+        self.int1 = None
+        self.int2 = None
+        self.int1_flag = None
+        self.int2_flag = None
+        self.cal_buf = bytearray(CAL_LEN)
+        self.motion_pin = 1
+        # INT2 output enable before enable_data_ready(), None when not enabled
+        self.drdy_int2_en = None
         self.init()
 
     def init(self):
         self.reset()
+        # burst reads rely on the address auto increment
+        self.ctrl1 |= CTRL1_ADDR_AI
         self.enable()
 
         # set low-pass filter
@@ -95,8 +194,8 @@ class QMI8658(I2CDevice):
             bits += 3
         else:
             raise ValueError('only 2, 4, 8, 16 g are supported for scale')
-        bits <<= 3
-        self.acc_config = bits
+        bits <<= 4
+        self.acc_config = (self.acc_config & ODR_MASK) | bits
         self.acc_scale = RESOLUTION // scale // 2
 
     def set_gyroscope_scale(self, scale=16):
@@ -117,10 +216,218 @@ class QMI8658(I2CDevice):
             bits += 6
         else:
             raise ValueError('only 16, 32, 64, 128, 256, 512, 1024 degree per second are supported for scale')
-        bits <<= 3
-        self.gyro_config = bits
+        bits <<= 4
+        self.gyro_config = (self.gyro_config & ODR_MASK) | bits
         self.gyro_scale = RESOLUTION // scale // 2
 
+    def attach_irq(self, int1=None, int2=None):
+        # the pin IRQs only set a flag, the I2C traffic happens in the waiting task
+        if int1 is not None:
+            self.int1 = int1
+            self.int1_flag = ThreadSafeFlag()
+            int1.init(Pin.IN)
+            self.set_irq_trigger(1, Pin.IRQ_RISING)
+        if int2 is not None:
+            self.int2 = int2
+            self.int2_flag = ThreadSafeFlag()
+            int2.init(Pin.IN)
+            self.set_irq_trigger(2, Pin.IRQ_RISING)
+
+    def set_irq_trigger(self, pin, trigger):
+        if pin == 1:
+            int_pin, flag = self.int1, self.int1_flag
+        else:
+            int_pin, flag = self.int2, self.int2_flag
+        if int_pin is not None:
+            int_pin.irq(lambda _: flag.set(), trigger)
+
+    def enable_data_ready(self):
+        ctrl1 = self.ctrl1
+        if self.drdy_int2_en is None:
+            # restored by disable_data_ready()
+            self.drdy_int2_en = ctrl1 & CTRL1_INT2_EN
+        self.reg_enable &= ~CTRL7_DRDY_DIS
+        self.ctrl1 = ctrl1 | CTRL1_INT2_EN
+
+    def disable_data_ready(self):
+        self.reg_enable |= CTRL7_DRDY_DIS
+        if self.drdy_int2_en is not None:
+            if not self.drdy_int2_en:
+                self.ctrl1 &= ~CTRL1_INT2_EN
+            self.drdy_int2_en = None
+
+    async def wait_data_ready(self):
+        if self.int2_flag is None:
+            await sleep_ms(max(1, int(1000 // self.odr)))
+        else:
+            await self.int2_flag.wait()
+
+    def write_cal(self, cal1=0, cal2=0, cal3=0, cal4=0):
+        buf = self.cal_buf
+        for i, value in enumerate((cal1, cal2, cal3, cal4)):
+            buf[2 * i] = value & 0xFF
+            buf[2 * i + 1] = (value >> 8) & 0xFF
+        self.write_reg(REG_CAL1_L, buf)
+
+    def enable_wake_on_motion(self, threshold_mg=100, blanking=0, pin=1, odr=21):
+        # the accelerometer runs alone in low power mode and the selected
+        # pin toggles on every wake up event
+        if odr not in LOW_POWER_ODR:
+            raise ValueError('only 128, 21, 11, 3 Hz are supported for odr')
+        if not 0 < threshold_mg <= 0xFF:
+            raise ValueError('threshold should be within (0, 255] mg')
+        self.reg_enable = 0
+        self.acc_config = (self.acc_config & ~ODR_MASK) | LOW_POWER_ODR[odr]
+        # CAL1_H[7:6]: 01 -> INT1, 11 -> INT2 with the line initially high
+        select = 0b01 if pin == 1 else 0b11
+        self.write_cal(select << 14 | (blanking & 0b11_1111) << 8 | threshold_mg)
+        self.command(CTRL_CMD_WRITE_WOM_SETTING)
+        # the pin stays high-Z unless its output is enabled
+        if pin == 1:
+            self.ctrl1 |= CTRL1_INT1_EN
+        else:
+            self.ctrl1 |= CTRL1_INT2_EN
+        self.set_irq_trigger(pin, Pin.IRQ_RISING | Pin.IRQ_FALLING)
+        self.reg_enable = 0b01
+
+    def disable_wake_on_motion(self):
+        self.reg_enable = 0
+        self.write_cal()
+        self.command(CTRL_CMD_WRITE_WOM_SETTING)
+        self.set_irq_trigger(1, Pin.IRQ_RISING)
+        self.set_irq_trigger(2, Pin.IRQ_RISING)
+        self.set_output_data_rate(self.odr)
+        self.enable()
+
+    def configure_tap(self, peak_window=20, priority=0, tap_window=50, double_tap_window=250,
+                      alpha=0.0625, gamma=0.25, peak_threshold=0.8, quiet_threshold=0.4):
+        # windows are in samples, thresholds in g^2 (U5.11)
+        self.write_cal(priority << 8 | peak_window, tap_window, double_tap_window, 0x01 << 8)
+        self.command(CTRL_CMD_CONFIGURE_TAP)
+        self.write_cal(int(gamma * 0x80) << 8 | int(alpha * 0x80),
+                       int(peak_threshold * 0x800), int(quiet_threshold * 0x800), 0x02 << 8)
+        self.command(CTRL_CMD_CONFIGURE_TAP)
+
+    def configure_motion(self, any_threshold=0.1, no_threshold=0.05, any_window=1, no_window=100,
+                         mode=ANY_MOTION_X | ANY_MOTION_Y | ANY_MOTION_Z | NO_MOTION_X | NO_MOTION_Y | NO_MOTION_Z,
+                         sig_wait_window=0, sig_confirm_window=0):
+        # thresholds are in g (U3.5), windows in samples
+        any_thr = min(0xFF, int(any_threshold * 32))
+        no_thr = min(0xFF, int(no_threshold * 32))
+        self.write_cal(any_thr << 8 | any_thr, no_thr << 8 | any_thr, no_thr << 8 | no_thr, 0x01 << 8 | mode)
+        self.command(CTRL_CMD_CONFIGURE_MOTION)
+        self.write_cal(no_window << 8 | any_window, sig_wait_window, sig_confirm_window, 0x02 << 8)
+        self.command(CTRL_CMD_CONFIGURE_MOTION)
+
+    def enable_motion_events(self, tap=False, any_motion=False, no_motion=False, pin=1):
+        bits = 0
+        if tap:
+            bits |= CTRL8_TAP_EN
+        if any_motion:
+            bits |= CTRL8_ANY_MOTION_EN
+        if no_motion:
+            bits |= CTRL8_NO_MOTION_EN
+        if pin == 1:
+            bits |= CTRL8_ACTIVITY_INT_SEL
+            self.ctrl1 |= CTRL1_INT1_EN
+        else:
+            self.ctrl1 |= CTRL1_INT2_EN
+        self.disable()
+        self.ctrl8 = bits
+        self.enable()
+        self.motion_pin = pin
+
+    def disable_motion_events(self):
+        self.ctrl8 = 0
+
+    def read_motion_status(self):
+        return self.status1 & MOTION_MASK
+
+    def read_tap(self):
+        # bit 7: polarity, [5:4]: axis, [1:0]: 1 single / 2 double tap
+        return self.tap_status
+
+    async def wait_motion(self, pin=None):
+        if pin is None:
+            pin = self.motion_pin
+        flag = self.int1_flag if pin == 1 else self.int2_flag
+        while True:
+            if flag is None:
+                await sleep_ms(100)
+            else:
+                await flag.wait()
+            status = self.read_motion_status()
+            if status:
+                return status
+
+    def set_output_data_rate(self, odr):
+        if odr not in ODR:
+            raise ValueError('only 8000, 4000, 2000, 1000, 500, 250, 125, 62.5, 31.25 Hz are supported for odr')
+        bits = ODR[odr]
+        self.acc_config = (self.acc_config & ~ODR_MASK) | bits
+        self.gyro_config = (self.gyro_config & ~ODR_MASK) | bits
+        self.odr = odr
+
+    def command(self, cmd, timeout_ms=100):
+        # CTRL9 handshake: wait for CmdDone, acknowledge, wait for it to clear
+        self.ctrl9 = cmd
+        self.wait_status_int(STATUSINT_CMD_DONE, timeout_ms)
+        self.ctrl9 = CTRL_CMD_ACK
+        self.wait_status_int(0, timeout_ms)
+
+    def wait_status_int(self, value, timeout_ms):
+        start = time.ticks_ms()
+        while self.status_int & STATUSINT_CMD_DONE != value:
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                raise RuntimeError("QMI8658 command timeout")
+
+    def enable_fifo(self, watermark=16, size=128, odr=None, mode=FIFO_MODE_STREAM):
+        if size not in FIFO_SIZE:
+            raise ValueError('only 16, 32, 64, 128 samples are supported for size')
+        if not 0 < watermark <= size:
+            raise ValueError('watermark should be within (0, size]')
+        self.disable()
+        if odr is not None:
+            self.set_output_data_rate(odr)
+        self.fifo_watermark = watermark
+        self.fifo_config = FIFO_SIZE[size] << 2 | mode
+        self.fifo_ctrl = self.fifo_config
+        self.command(CTRL_CMD_RST_FIFO)
+        if self.int1_flag is not None:
+            # watermark interrupt on INT1, leaving INT2 for data ready
+            self.ctrl1 |= CTRL1_INT1_EN | CTRL1_FIFO_INT_SEL
+        self.enable()
+        # in 6DOF mode the gyroscope paces the FIFO at about 0.9 * odr
+        self.fifo_period_ms = max(1, watermark * 1000 // int(self.odr * 0.9))
+
+    def disable_fifo(self):
+        self.fifo_config = FIFO_MODE_BYPASS
+        self.fifo_ctrl = self.fifo_config
+
+    def read_fifo(self, ring):
+        self.command(CTRL_CMD_REQ_FIFO)
+        count = self.read_reg_into(REG_FIFO_SMPL_CNT, self.fifo_count)
+        # FIFO_STATUS[1:0] holds the MSBs, the count is in 16-bit words
+        words = (count[1] & 0b11) << 8 | count[0]
+        n = words // ring.width
+        remaining = n
+        while remaining > 0:
+            span = ring.reserve(remaining)
+            self.read_reg_into(REG_FIFO_DATA, span)
+            remaining -= ring.commit(len(span) // ring.width)
+        # leave the FIFO read mode
+        self.fifo_ctrl = self.fifo_config
+        return n
+
+    async def wait_fifo(self):
+        if self.int1_flag is None:
+            await sleep_ms(self.fifo_period_ms)
+        else:
+            await self.int1_flag.wait()
+
+    def stream_fifo(self, capacity=512):
+        return FIFOStream(self, SampleRing(capacity))
+
     def enable(self):
         data = self.reg_enable
         data |= 0b11
@@ -131,8 +438,54 @@ class QMI8658(I2CDevice):
         data &= 0b11111100
         self.reg_enable = data
 
-    def read_accelerometer(self, mps2=False):
-        x, y, z = self.acc_data
+    def read_all(self, out=None):
+        # REG_TEMP_L .. REG_GZ_H are contiguous little-endian int16s,
+        # so one burst fills the array directly
+        if out is None:
+            out = self.sample
+        return self.read_reg_into(REG_TEMP_L, out)
+
+    def read_raw_accelerometer(self, out=None):
+        # int16 counts, divide by acc_scale for g
+        if out is None:
+            out = self.acc_raw
+        return self.read_reg_into(REG_AX_L, out)
+
+    def read_raw_gyroscope(self, out=None):
+        # int16 counts, divide by gyro_scale for degree per second
+        if out is None:
+            out = self.gyro_raw
+        return self.read_reg_into(REG_GX_L, out)
+
+    def scale_factors(self):
+        acc = 1 / self.acc_scale
+        gyro = DEGREE / self.gyro_scale
+        return acc, acc, acc, gyro, gyro, gyro
+
+    def scale_batch(self, raw, out=None):
+        # raw: rows of (ax, ay, az, gx, gy, gz) counts such as FIFO batches,
+        # result: g and rad/s
+        factors = self.scale_factors()
+        if np is not None:
+            block = np.frombuffer(raw, dtype=np.int16).reshape((-1, FIFO_SAMPLE_WIDTH))
+            return block * np.array(factors)
+        n = len(raw)
+        if out is None:
+            out = array('f', bytes(4 * n))
+        for i in range(n):
+            out[i] = raw[i] * factors[i % FIFO_SAMPLE_WIDTH]
+        return out
+
+    def read_temperature(self, sample=None):
+        if sample is None:
+            sample = self.read_all()
+        return sample[0] / TEMP_SCALE
+
+    def read_accelerometer(self, mps2=False, sample=None):
+        if sample is None:
+            x, y, z = self.acc_data
+        else:
+            x, y, z = sample[1], sample[2], sample[3]
 
         x /= self.acc_scale
         y /= self.acc_scale
@@ -143,8 +496,11 @@ class QMI8658(I2CDevice):
             z *= STANDARD_GRAVITY
         return x, y, z
 
-    def read_gyproscope(self):
-        x, y, z = self.gyro_data
+    def read_gyproscope(self, sample=None):
+        if sample is None:
+            x, y, z = self.gyro_data
+        else:
+            x, y, z = sample[4], sample[5], sample[6]
 
         x /= self.gyro_scale
         y /= self.gyro_scale
@@ -155,3 +511,58 @@ class QMI8658(I2CDevice):
         z *= DEGREE
 
         return x, y, z
+
+
+class SampleRing:
+    def __init__(self, capacity, width=FIFO_SAMPLE_WIDTH) -> None:
+        self.capacity = capacity
+        self.width = width
+        self.data = array('h', bytes(2 * width * capacity))
+        self.mv = memoryview(self.data)
+        self.head = 0  # next slot to write
+        self.tail = 0  # next slot to read
+        self.count = 0
+        self.dropped = 0
+
+    def reserve(self, n):
+        # contiguous free span starting at head, at most n samples
+        n = min(n, self.capacity - self.head)
+        start = self.head * self.width
+        return self.mv[start:start + n * self.width]
+
+    def commit(self, n):
+        self.head = (self.head + n) % self.capacity
+        self.count += n
+        if self.count > self.capacity:
+            # the oldest samples have been overwritten
+            self.dropped += self.count - self.capacity
+            self.count = self.capacity
+            self.tail = self.head
+        return n
+
+    def take(self):
+        # contiguous span of unread samples, valid until the ring wraps onto it
+        if self.count == 0:
+            return None
+        n = min(self.count, self.capacity - self.tail)
+        start = self.tail * self.width
+        self.tail = (self.tail + n) % self.capacity
+        self.count -= n
+        return self.mv[start:start + n * self.width]
+
+
+class FIFOStream:
+    def __init__(self, imu, ring) -> None:
+        self.imu = imu
+        self.ring = ring
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            batch = self.ring.take()
+            if batch is not None:
+                return batch
+            await self.imu.wait_fifo()
+            self.imu.read_fifo(self.ring)
@@ -1,8 +1,20 @@
+from array import array
 from machine import Pin, PWM, SPI
+import micropython
 from micropython import const
-from time import sleep
+from os import uname
+from time import sleep, sleep_ms
 import struct
 from framebuf import FrameBuffer, RGB565
+from blob import Blob, copy, rgb565_to_rgb444, rgb565_to_rgb666
+
+from .dirty import DirtyRects
+
+
+# FrameBuffer drawing methods replaced by ST7796.tracked_<name> while dirty
+# rectangles are tracked
+TRACKED_METHODS = ('fill', 'pixel', 'hline', 'vline', 'line', 'rect', 'fill_rect',
+                   'ellipse', 'poly', 'text', 'blit', 'scroll')
 
 
 class ST7796(FrameBuffer):
@@ -36,6 +48,8 @@ class ST7796(FrameBuffer):
     VSCRDEF = const(0x33)  # Vertical scrolling definition
     MADCTL = const(0x36)  # Memory access control
     VSCRSADD = const(0x37)  # Vertical scrolling start address
+    IDLE_OFF = const(0x38)  # Idle mode off
+    IDLE_ON = const(0x39)  # Idle mode on (8 colors)
     PIXFMT = const(0x3A)  # COLMOD: Pixel format set
 
     ST7796_MAD_MY   = const(0x80)
@@ -93,6 +107,34 @@ class ST7796(FrameBuffer):
     ST7796_MADCTL_BGR  = 0x08
     ST7796_MADCTL_MH   = 0x04
 
+    # block_async() returns before the data is on the wire
+    async_flush = False
+    # size of the repeated pattern streamed by fill_area()
+    fill_pixels = 1024
+    # interface pixel format, image data is always rgb565 and packed on the way out
+    bits = 16
+    # rgb565 byte order expected by the panel, see RAMCTRL of ST7789SPI
+    little_endian = False
+    PIXEL_FORMATS = {
+        12: 0x03,
+        16: 0x05,
+        18: 0x06,
+    }
+
+    # (command, parameters, delay in ms) sent by init()
+    INIT_SEQUENCE = (
+        (0xF0, b'\xC3', 0),
+        (0xF0, b'\x96', 0),
+        (PIXFMT, b'\x05', 0),
+        (0xE8, b'\x40\x82\x07\x18\x27\x0A\xB6\x33', 0),
+        (VMCTR1, b'\x27', 0),
+        (PWCTR3, b'\xA7', 0),
+        (GMCTRP1, b'\xF0\x01\x06\x0F\x12\x1D\x36\x54\x44\x0C\x18\x16\x13\x15', 0),
+        (GMCTRN1, b'\xF0\x01\x05\x0A\x0b\x07\x32\x44\x44\x0C\x18\x17\x13\x16', 100),
+        (0xF0, b'\x3C', 0),
+        (0xF0, b'\x69', 100),
+    )
+
     ROTATE = {
         0: 0x88,
         90: 0xE8,
@@ -100,7 +142,8 @@ class ST7796(FrameBuffer):
         270: 0x28
     }
 
-    def __init__(self, rst, cs, dc, blk, width, height, rotation=180, offset_x=0, offset_y=0, dx=0, dy=0) -> None:
+    def __init__(self, rst, cs, dc, blk, width, height, rotation=180, offset_x=0, offset_y=0, dx=0, dy=0,
+                 double_buffer=False) -> None:
         self.rst = Pin(rst, Pin.OUT, value=1)
         if cs:
             self.cs = Pin(cs, Pin.OUT, value=1)
@@ -125,8 +168,37 @@ class ST7796(FrameBuffer):
         self.dx = dx
         self.dy = dy
 
+        # preallocated command path, the window is packed in place
+        self.window = bytearray(4)
+        self.scroll_buf = bytearray(2)
+        self.win = [-1, -1, -1, -1]
+
         size = dx * dy * 2  # rgb565
-        self.buf = bytearray(size)
+        # double buffered: drawing goes to buf (back) while update() sends a
+        # copy of it (front) in the background
+        # the blobs have no len(), the send paths only get their memoryviews
+        self.back = None
+        self.front = None
+        self.front_mv = None
+        self.sending = False
+        self.sent_cb = self.sent
+        if double_buffer:
+            self.back = self.alloc_frame(size)
+            self.buf = self.back.mv()
+            self.front = self.alloc_frame(size)
+            self.front_mv = self.front.mv()
+        else:
+            self.buf = bytearray(size)
+        # None: update() sends the whole buffer, see track_dirty()
+        self.dirty = None
+        self.fill_blob = None
+        self.fill_mv = None
+        self.fill_color = None
+        self.pack_blob = None
+        self.pack_mv = None
+        # (start, end) rows while in partial mode, None in normal mode
+        self.partial = None
+        self.idle = False
         super().__init__(self.buf, dx, dy, RGB565)
 
     def hard_reset(self):
@@ -149,63 +221,313 @@ class ST7796(FrameBuffer):
         self.sleep_out()
 
     def init(self):
-        self.write_cmd(0xF0, 0xC3)
-        self.write_cmd(0xF0, 0x96)
+        self.invalidate_window()
+        self.write_sequence(self.INIT_SEQUENCE)
         self.write_cmd(self.MADCTL, self.rotation_cmd_param)
+        if self.bits != 16:
+            self.write_cmd(self.PIXFMT, self.PIXEL_FORMATS[self.bits])
+
+    def set_pixel_format(self, bits):
+        # 12 bits cuts the bytes on the wire by 25%, 18 bits adds 50%
+        if bits not in self.PIXEL_FORMATS:
+            raise ValueError("pixel format should be 12, 16 or 18 bits")
+        self.write_cmd(self.PIXFMT, self.PIXEL_FORMATS[bits])
+        self.bits = bits
+        self.fill_color = None
+
+    def wire_bytes(self, pixels):
+        bits = self.bits
+        if bits == 16:
+            return pixels * 2
+        elif bits == 12:
+            return (pixels * 3 + 1) // 2
+        elif bits == 18:
+            return pixels * 3
+        else:
+            raise ValueError("unknown pixel format")
+
+    def pack(self, data):
+        # rgb565 (panel byte order) in the interface format, in a reused DMA blob;
+        # LVGL only flushes again once the previous flush is done
+        if self.bits == 16 or not data:
+            return data
+        size = self.wire_bytes(len(data) // 2)
+        if self.pack_blob is None or len(self.pack_mv) < size:
+            if self.pack_blob is not None:
+                self.pack_blob.free()
+            self.pack_blob = Blob().malloc_pool(size)
+            self.pack_mv = self.pack_blob.mv()
+        if self.bits == 12:
+            size = rgb565_to_rgb444(data, self.pack_mv, self.little_endian)
+        else:
+            size = rgb565_to_rgb666(data, self.pack_mv, self.little_endian)
+        return self.pack_blob.view(0, size)
 
-        self.write_cmd(self.PIXFMT, 0x05)
-        # self.write_cmd(self.INVCTR, 0x01)
-        # self.write_cmd(self.DFUNCTR, 0x80, 0x02, 0x3B)
-        self.write_cmd(0xE8,
-                       0x40, 0x82, 0x07, 0x18,
-                       0x27, 0x0A, 0xB6, 0x33)
-
-        self.write_cmd(self.VMCTR1, 0x27)
-        self.write_cmd(self.PWCTR3, 0xA7)
-
-        self.write_cmd(self.GMCTRP1,
-                       0xF0, 0x01, 0x06, 0x0F,
-                       0x12, 0x1D, 0x36, 0x54,
-                       0x44, 0x0C, 0x18, 0x16,
-                       0x13, 0x15)
-        self.write_cmd(self.GMCTRN1,
-                       0xF0, 0x01, 0x05, 0x0A,
-                       0x0b, 0x07, 0x32, 0x44,
-                       0x44, 0x0C, 0x18, 0x17,
-                       0x13, 0x16)
-        sleep(.1)
-        self.write_cmd(0xF0, 0x3C)
-        self.write_cmd(0xF0, 0x69)
-        sleep(.1)
+    def write_sequence(self, sequence):
+        for cmd, data, delay in sequence:
+            self.write_cmd_buf(cmd, data)
+            if delay:
+                sleep_ms(delay)
 
     def write_mem(self, data):
-        self.write_color(self.WRITE_RAM, data)
+        self.write_color(self.WRITE_RAM, self.pack(data))
+
+    def invalidate_window(self):
+        win = self.win
+        win[0] = win[1] = win[2] = win[3] = -1
+
+    def set_window(self, x0, y0, x1, y1, write=None):
+        # CASET/RASET are only sent when the window changes
+        if write is None:
+            write = self.write_cmd_buf
+        win = self.win
+        window = self.window
+        if win[0] != x0 or win[2] != x1:
+            struct.pack_into(">HH", window, 0, x0, x1)
+            write(self.SET_COLUMN, window)
+            win[0] = x0
+            win[2] = x1
+        if win[1] != y0 or win[3] != y1:
+            struct.pack_into(">HH", window, 0, y0, y1)
+            write(self.SET_PAGE, window)
+            win[1] = y0
+            win[3] = y1
 
     def block(self, x0, y0, x1, y1, data=None):
-        self.write_cmd(self.SET_COLUMN, *struct.pack(">HH", x0, x1))
-        self.write_cmd(self.SET_PAGE, *struct.pack(">HH", y0, y1))
-
+        self.set_window(x0, y0, x1, y1)
         if data is None:
-            data = bytearray()
+            data = b''
         self.write_mem(data)
 
+    def define_scroll(self, top, height, bottom=None):
+        # VSCRDEF: fixed top rows, scrolling rows, fixed bottom rows (panel memory rows)
+        if bottom is None:
+            bottom = self.height - top - height
+        if top < 0 or height <= 0 or bottom < 0:
+            raise ValueError("invalid scroll area")
+        self.write_cmd_buf(self.VSCRDEF, struct.pack(">HHH", top, height, bottom))
+        self.scroll_start(top)
+
+    def scroll_start(self, line):
+        # VSCRSADD: memory row shown first in the scroll area
+        struct.pack_into(">H", self.scroll_buf, 0, line)
+        self.write_cmd_buf(self.VSCRSADD, self.scroll_buf)
+
+    def block_async(self, x0, y0, x1, y1, data, callback):
+        # callback(arg) runs once data may be reused, synchronously here
+        self.block(x0, y0, x1, y1, data)
+        callback(self)
+
+    def wait(self):
+        pass
+
+    def block_rows(self, x0, y0, x1, y1, buf, stride, offset=0):
+        # the area's rows are stride bytes apart in buf, starting at offset
+        row = (x1 - x0 + 1) * 2
+        h = y1 - y0 + 1
+        mv = memoryview(buf)
+        if row == stride:
+            self.block(x0, y0, x1, y1, mv[offset:offset + row * h])
+            return
+        if self.bits != 16:
+            # packed rows can end mid-byte, each one gets its own window
+            for y in range(y0, y1 + 1):
+                self.block(x0, y, x1, y, mv[offset:offset + row])
+                offset += stride
+            return
+        self.set_window(x0, y0, x1, y1)
+        self.write_cmd_buf(self.WRITE_RAM)
+        for _ in range(h):
+            self.write_data(mv[offset:offset + row])
+            offset += stride
+
+    def track_dirty(self, enable=True, slack=None, max_rects=8):
+        # update() then only sends what the drawing methods touched; untracked
+        # drawing keeps calling the native FrameBuffer methods directly
+        if not enable:
+            if self.dirty is not None:
+                for name in TRACKED_METHODS:
+                    delattr(self, name)
+            self.dirty = None
+            return
+        if self.dirty is None:
+            for name in TRACKED_METHODS:
+                setattr(self, name, getattr(self, 'tracked_' + name))
+        self.dirty = DirtyRects(self.dx, self.dy, slack=slack, max_rects=max_rects)
+        self.dirty.add_all()
+
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        # for writes to self.buf that bypass the drawing methods
+        if self.dirty is not None:
+            w = self.dx if w is None else w
+            h = self.dy if h is None else h
+            self.dirty.add(x, y, x + w - 1, y + h - 1)
+
+    @staticmethod
+    def alloc_frame(size):
+        # internal DMA memory if it fits, PSRAM otherwise
+        try:
+            return Blob().malloc_dma(size)
+        except OSError:
+            return Blob().malloc_dma(size, spiram=True)
+
+    def sent(self, _):
+        self.sending = False
+
+    def wait_update(self):
+        # the front buffer is free again
+        if self.sending:
+            self.wait()
+            self.sending = False
+
     def update(self):
         x0 = self.offset_x
         y0 = self.offset_y
-        x1 = x0 + self.dx - 1
-        y1 = y0 + self.dy - 1
-        self.block(x0, y0, x1, y1, self.buf)
+        dirty = self.dirty
+        buf = self.buf
+        if self.front is not None:
+            self.wait_update()
+            self.front.copy_from(buf)
+            buf = self.front_mv
+        if dirty is None:
+            x1 = x0 + self.dx - 1
+            y1 = y0 + self.dy - 1
+            if self.front is None:
+                self.block(x0, y0, x1, y1, buf)
+            else:
+                self.sending = True
+                self.block_async(x0, y0, x1, y1, buf, self.sent_cb)
+            return
+        # dirty rectangles are not contiguous, they go out synchronously row by row
+        stride = self.dx * 2
+        for x, y, x1, y1 in dirty.rects:
+            self.block_rows(x0 + x, y0 + y, x0 + x1, y0 + y1, buf, stride, y * stride + x * 2)
+        dirty.clear()
+
+    # drawing methods of FrameBuffer recording what they touch, track_dirty()
+    # binds them over the native ones
+    def tracked_fill(self, c):
+        FrameBuffer.fill(self, c)
+        self.dirty.add_all()
+
+    def tracked_pixel(self, x, y, c=None):
+        if c is None:
+            return FrameBuffer.pixel(self, x, y)
+        FrameBuffer.pixel(self, x, y, c)
+        self.dirty.add(x, y, x, y)
+
+    def tracked_hline(self, x, y, w, c):
+        FrameBuffer.hline(self, x, y, w, c)
+        self.dirty.add(x, y, x + w - 1, y)
+
+    def tracked_vline(self, x, y, h, c):
+        FrameBuffer.vline(self, x, y, h, c)
+        self.dirty.add(x, y, x, y + h - 1)
+
+    def tracked_line(self, x1, y1, x2, y2, c):
+        FrameBuffer.line(self, x1, y1, x2, y2, c)
+        self.dirty.add(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def tracked_rect(self, x, y, w, h, c, *args):
+        FrameBuffer.rect(self, x, y, w, h, c, *args)
+        self.dirty.add(x, y, x + w - 1, y + h - 1)
+
+    def tracked_fill_rect(self, x, y, w, h, c):
+        FrameBuffer.fill_rect(self, x, y, w, h, c)
+        self.dirty.add(x, y, x + w - 1, y + h - 1)
+
+    def tracked_ellipse(self, x, y, xr, yr, c, *args):
+        FrameBuffer.ellipse(self, x, y, xr, yr, c, *args)
+        self.dirty.add(x - xr, y - yr, x + xr, y + yr)
+
+    def tracked_poly(self, x, y, coords, c, *args):
+        FrameBuffer.poly(self, x, y, coords, c, *args)
+        x0 = x1 = coords[0]
+        y0 = y1 = coords[1]
+        for i in range(2, len(coords), 2):
+            x0 = min(x0, coords[i])
+            x1 = max(x1, coords[i])
+            y0 = min(y0, coords[i + 1])
+            y1 = max(y1, coords[i + 1])
+        self.dirty.add(x + x0, y + y0, x + x1, y + y1)
+
+    def tracked_text(self, s, x, y, c=1):
+        FrameBuffer.text(self, s, x, y, c)
+        self.dirty.add(x, y, x + len(s) * 8 - 1, y + 7)
+
+    def tracked_blit(self, fbuf, x, y, *args):
+        FrameBuffer.blit(self, fbuf, x, y, *args)
+        if isinstance(fbuf, tuple):
+            # (buffer, width, height, format[, stride])
+            self.dirty.add(x, y, x + fbuf[1] - 1, y + fbuf[2] - 1)
+        else:
+            # the size of a FrameBuffer is not exposed
+            self.dirty.add(x, y, self.dx - 1, self.dy - 1)
+
+    def tracked_scroll(self, xstep, ystep):
+        FrameBuffer.scroll(self, xstep, ystep)
+        self.dirty.add_all()
+
+    def fill_pattern(self, color):
+        # a DMA blob filled with color (rgb565 in the panel's byte order) in
+        # the interface format, rebuilt only on change
+        if self.fill_blob is None:
+            self.fill_blob = Blob().malloc_pool(self.fill_pixels * 3)
+            self.fill_color = None
+        if color != self.fill_color:
+            blob = self.fill_blob
+            n = blob.copy_from(self.pack(color.to_bytes(2, 'little' if self.little_endian else 'big') * 2))
+            # double the seed in place, whole periods of it only
+            size = self.wire_bytes(self.fill_pixels) // n * n
+            while n < size:
+                n += copy(blob, blob, 0, min(n, size - n), n)
+            self.fill_color = color
+            self.fill_mv = blob.view(0, size)
+        return self.fill_mv
+
+    def fill_area(self, x, y, w, h, color):
+        # solid rectangle on the panel: one window, then the pattern repeated
+        if w <= 0 or h <= 0:
+            return
+        pattern = self.fill_pattern(color)
+        self.set_window(x, y, x + w - 1, y + h - 1)
+        self.write_cmd_buf(self.WRITE_RAM)
+        remaining = self.wire_bytes(w * h)
+        chunk = len(pattern)
+        while remaining > chunk:
+            self.write_data(pattern)
+            remaining -= chunk
+        self.write_data(pattern[:remaining])
 
     def clear(self, color=0):
-        w = self.width
-        h = self.height
-
-        if color:
-            line = color.to_bytes(2, 'big') * (w * 8)
+        self.fill_area(0, 0, self.width, self.height, color)
+
+    def partial_mode(self, start, end):
+        # only rows start..end are refreshed, the rest of the panel is blank
+        if self.partial == (start, end):
+            return
+        self.write_cmd_buf(self.PTLAR, struct.pack(">HH", start, end))
+        if self.partial is None:
+            self.write_cmd(self.PTLON)
+        self.partial = (start, end)
+
+    def normal_mode(self):
+        if self.partial is not None:
+            self.write_cmd(self.NORON)
+            self.partial = None
+
+    def idle_mode(self, on=True):
+        # 8 colors, lower refresh work for static screens
+        if on != self.idle:
+            self.write_cmd(self.IDLE_ON if on else self.IDLE_OFF)
+            self.idle = on
+
+    def set_power_mode(self, area=None, idle=False):
+        if area is None:
+            self.normal_mode()
         else:
-            line = bytearray(w * 16)
-        for y in range(0, h, 8):
-            self.block(0, y, w - 1, y + 7, line)
+            self.partial_mode(*area)
+        self.idle_mode(idle)
 
     def display_off(self):
         self.write_cmd(self.DISPLAY_OFF)
@@ -215,11 +537,31 @@ class ST7796(FrameBuffer):
 
     def deinit(self):
         self.blk_pwm.deinit()
+        if self.front is not None:
+            self.wait_update()
+            self.front.free()
+            self.front = None
+            self.front_mv = None
+            # the FrameBuffer keeps a reference, it is not usable any more
+            self.back.free()
+            self.back = None
+        if self.fill_blob is not None:
+            self.fill_blob.free()
+            self.fill_blob = None
+        if self.pack_blob is not None:
+            self.pack_blob.free()
+            self.pack_blob = None
 
     # overload the following for different peripherals
     def write_cmd(self, cmd, *args):
         pass
 
+    def write_cmd_buf(self, cmd, data=None):
+        # like write_cmd, with the parameters already in a buffer
+        self.write_cmd(cmd)
+        if data:
+            self.write_data(data)
+
     def write_data(self, data):
         pass
 
@@ -244,15 +586,59 @@ def split_data(data, step):
         start += step
 
 
+# ESP32-S3 GPIO_OUT_W1TS_REG / GPIO_OUT_W1TC_REG, pins 0..31
+GPIO_OUT_W1TS = const(0x60004008)
+GPIO_OUT_W1TC = const(0x6000400C)
+LUT_DATA_MASK = const(256)
+LUT_WR_MASK = const(257)
+
+
+@micropython.viper
+def write_bus(buf, n: int, lut):
+    # lut[b]: set mask of byte b, lut[256]: all data pins, lut[257]: wr
+    src = ptr8(buf)
+    table = ptr32(lut)
+    w1ts = ptr32(GPIO_OUT_W1TS)
+    w1tc = ptr32(GPIO_OUT_W1TC)
+    low = table[LUT_DATA_MASK] | table[LUT_WR_MASK]
+    wr = table[LUT_WR_MASK]
+    i = 0
+    while i < n:
+        w1tc[0] = low
+        w1ts[0] = table[src[i]]
+        w1ts[0] = wr
+        i += 1
+
+
 class ST7796PY(ST7796):
     def __init__(self, rst, cs, dc, blk, wr, data,
-                 width=320, height=480, rotation=0, offset_x=0, offset_y=0, dx=0, dy=0) -> None:
+                 width=320, height=480, rotation=0, offset_x=0, offset_y=0, dx=0, dy=0,
+                 double_buffer=False) -> None:
 
         self.wr = Pin(wr, Pin.OUT, value=1)
         self.data = [Pin(i, Pin.OUT) for i in data]
+        self.lut = self.build_lut(wr, data)
+        self.cmd = bytearray(1)
         super().__init__(rst=rst, cs=cs, dc=dc, blk=blk,
                          width=width, height=height, rotation=rotation,
-                         offset_x=offset_x, offset_y=offset_y, dx=dx, dy=dy)
+                         offset_x=offset_x, offset_y=offset_y, dx=dx, dy=dy,
+                         double_buffer=double_buffer)
+
+    @staticmethod
+    def build_lut(wr, data):
+        # byte -> gpio set mask, None when the registers can not be written directly
+        if 'ESP32S3' not in uname().machine or wr >= 32 or len(data) != 8 or max(data) >= 32:
+            return None
+        lut = array('I', bytes(4 * 258))
+        for b in range(256):
+            mask = 0
+            for i in range(8):
+                if b & (1 << i):
+                    mask |= 1 << data[i]
+            lut[b] = mask
+        lut[LUT_DATA_MASK] = lut[255]
+        lut[LUT_WR_MASK] = 1 << wr
+        return lut
 
     def write_byte(self, dat):
         self.cs(0)
@@ -268,15 +654,29 @@ class ST7796PY(ST7796):
         self.cs(1)
 
     def write_cmd(self, cmd, *args):
+        self.write_cmd_buf(cmd, bytearray(args) if args else None)
+
+    def write_cmd_buf(self, cmd, data=None):
         self.dc(0)
-        self.write_byte(cmd)
-        if args:
-            self.write_data(bytearray(args))
+        if self.lut is None:
+            self.write_byte(cmd)
+        else:
+            self.cmd[0] = cmd
+            self.cs(0)
+            write_bus(self.cmd, 1, self.lut)
+            self.cs(1)
+        if data:
+            self.write_data(data)
 
     def write_data(self, data):
         self.dc(1)
-        for b in data:
-            self.write_byte(b)
+        if self.lut is None:
+            for b in data:
+                self.write_byte(b)
+            return
+        self.cs(0)
+        write_bus(data, len(data), self.lut)
+        self.cs(1)
 
 
 class ST7796SPI(ST7796):
@@ -284,54 +684,186 @@ class ST7796SPI(ST7796):
     default_height = 480
 
     def __init__(self, rst, cs, dc, blk, spi: SPI,
-                 width=None, height=None, rotation=0, offset_x=0, offset_y=0, dx=0, dy=0) -> None:
+                 width=None, height=None, rotation=0, offset_x=0, offset_y=0, dx=0, dy=0,
+                 double_buffer=False) -> None:
 
         self.spi = spi
+        self.cmd = bytearray(1)
+        self.send_cb = self.send
+        # number of spi writes, to measure the command overhead
+        self.transactions = 0
         super().__init__(rst=rst, cs=cs, dc=dc, blk=blk,
                          width=width or self.default_width, height=height or self.default_height, rotation=rotation,
-                         offset_x=offset_x, offset_y=offset_y, dx=dx, dy=dy)
+                         offset_x=offset_x, offset_y=offset_y, dx=dx, dy=dy,
+                         double_buffer=double_buffer)
 
-    def write_cmd(self, command, *args):
+    def send(self, cmd, data=None):
+        # one command and its data, cs is handled by the caller
+        self.cmd[0] = cmd
         self.dc(0)
+        self.spi.write(self.cmd)
+        self.transactions += 1
+        if data:
+            self.dc(1)
+            self.spi.write(data)
+            self.transactions += 1
+
+    def write_cmd(self, command, *args):
+        self.write_cmd_buf(command, bytes(args) if args else None)
+
+    def write_cmd_buf(self, cmd, data=None):
         self.cs(0)
-        self.spi.write(bytearray([command]))
+        self.send(cmd, data)
         self.cs(1)
-        if len(args) > 0:
-            self.write_data(bytearray(args))
 
     def write_data(self, data):
         self.dc(1)
         self.cs(0)
         self.spi.write(data)
+        self.transactions += 1
+        self.cs(1)
+
+    def write_sequence(self, sequence):
+        # the whole table under a single cs assertion
+        self.cs(0)
+        for cmd, data, delay in sequence:
+            self.send(cmd, data)
+            if delay:
+                sleep_ms(delay)
+        self.cs(1)
+
+    def block(self, x0, y0, x1, y1, data=None):
+        self.cs(0)
+        self.set_window(x0, y0, x1, y1, self.send_cb)
+        self.send(self.WRITE_RAM, self.pack(data))
+        self.cs(1)
+
+    def fill_area(self, x, y, w, h, color):
+        if w <= 0 or h <= 0:
+            return
+        pattern = self.fill_pattern(color)
+        self.cs(0)
+        self.set_window(x, y, x + w - 1, y + h - 1, self.send_cb)
+        self.send(self.WRITE_RAM)
+        self.dc(1)
+        remaining = self.wire_bytes(w * h)
+        chunk = len(pattern)
+        while remaining > chunk:
+            self.spi.write(pattern)
+            self.transactions += 1
+            remaining -= chunk
+        self.spi.write(pattern[:remaining])
+        self.transactions += 1
+        self.cs(1)
+
+    def block_rows(self, x0, y0, x1, y1, buf, stride, offset=0):
+        row = (x1 - x0 + 1) * 2
+        if row == stride or self.bits != 16:
+            return super().block_rows(x0, y0, x1, y1, buf, stride, offset)
+        mv = memoryview(buf)
+        self.cs(0)
+        self.set_window(x0, y0, x1, y1, self.send_cb)
+        self.send(self.WRITE_RAM)
+        self.dc(1)
+        for _ in range(y1 - y0 + 1):
+            self.spi.write(mv[offset:offset + row])
+            offset += stride
+        self.transactions += y1 - y0 + 1
         self.cs(1)
 
 
 class ST7789SPI(ST7796SPI):
+    # RAMCTRL (0xB0) selects little endian rgb565
+    little_endian = True
+    INIT_SEQUENCE = (
+        (ST7796.MADCTL, b'\x00', 0),
+        (ST7796.PIXFMT, b'\x05', 0),
+        (0xB0, b'\x00\xE8', 0),
+        (0xB2, b'\x0C\x0C\x00\x33\x33', 0),
+        (0xB7, b'\x75', 0),
+        (0xBB, b'\x1A', 0),
+        (0xC0, b'\x2C', 0),
+        (0xC2, b'\x01\xFF', 0),
+        (0xC3, b'\x13', 0),
+        (0xC4, b'\x20', 0),
+        (0xC6, b'\x0F', 0),
+        (0xD0, b'\xA4\xA1', 0),
+        (0xD6, b'\xA1', 0),
+        (ST7796.GMCTRP1, b'\xD0\x0D\x14\x0D\x0D\x09\x38\x44\x4E\x3A\x17\x18\x2F\x30', 0),
+        (ST7796.GMCTRN1, b'\xD0\x09\x0F\x08\x07\x14\x37\x44\x4D\x38\x15\x16\x2C\x2E', 0),
+        (ST7796.INVON, None, 0),
+    )
+
+    def init(self):
+        self.invalidate_window()
+        self.write_sequence(self.INIT_SEQUENCE)
+        if self.bits != 16:
+            self.write_cmd(self.PIXFMT, self.PIXEL_FORMATS[self.bits])
+
+
+class ST7796DMA(ST7796SPI):
+    # spi is a lcd_bus.SPIBus, which drives cs and dc itself
+    async_flush = True
+
+    def __init__(self, rst, blk, bus,
+                 width=None, height=None, rotation=0, offset_x=0, offset_y=0, dx=0, dy=0,
+                 double_buffer=False) -> None:
+        super().__init__(rst=rst, cs=None, dc=None, blk=blk, spi=bus,
+                         width=width, height=height, rotation=rotation,
+                         offset_x=offset_x, offset_y=offset_y, dx=dx, dy=dy,
+                         double_buffer=double_buffer)
+
+    def write_cmd_buf(self, cmd, data=None):
+        self.spi.tx_param(cmd, data)
+
+    def write_sequence(self, sequence):
+        ST7796.write_sequence(self, sequence)
+
+    def block_rows(self, x0, y0, x1, y1, buf, stride, offset=0):
+        ST7796.block_rows(self, x0, y0, x1, y1, buf, stride, offset)
+
+    def fill_area(self, x, y, w, h, color):
+        # the pattern is only read, so every chunk is queued before waiting once
+        if w <= 0 or h <= 0:
+            return
+        pattern = self.fill_pattern(color)
+        self.set_window(x, y, x + w - 1, y + h - 1)
+        self.write_cmd_buf(self.WRITE_RAM)
+        remaining = self.wire_bytes(w * h)
+        chunk = len(pattern)
+        while remaining > chunk:
+            self.spi.tx_color(-1, pattern)
+            remaining -= chunk
+        self.spi.tx_color(-1, pattern[:remaining])
+        self.spi.wait()
+
+    def write_data(self, data):
+        self.spi.tx_color(-1, data)
+        self.spi.wait()
+
+    def block(self, x0, y0, x1, y1, data=None):
+        self.set_window(x0, y0, x1, y1)
+        self.write_color(self.WRITE_RAM, self.pack(data) or b'')
+
+    def write_color(self, cmd, color):
+        self.spi.tx_color(cmd, color)
+        self.spi.wait()
+
+    def block_async(self, x0, y0, x1, y1, data, callback):
+        self.set_window(x0, y0, x1, y1)
+        self.spi.tx_color(self.WRITE_RAM, self.pack(data), callback)
+
+    def wait(self):
+        self.spi.wait()
+
+    def done_us(self):
+        # time.ticks_us() when the last block_async transfer finished
+        return self.spi.done_us()
+
+
+class ST7789DMA(ST7796DMA):
+    little_endian = True
+    INIT_SEQUENCE = ST7789SPI.INIT_SEQUENCE
+
     def init(self):
-        self.write_cmd(self.MADCTL, self.ST7796_MAD_RGB)
-        self.write_cmd(self.PIXFMT, 0x05)
-        self.write_cmd(0xB0, 0x00, 0xE8)
-        self.write_cmd(0xB2, 0x0C, 0x0C, 0x00, 0x33, 0x33)
-
-        self.write_cmd(0xB7, 0x75)
-        self.write_cmd(0xBB, 0x1A)
-
-        self.write_cmd(0xC0, 0x2C)
-        self.write_cmd(0xC2, 0x01, 0xFF)
-        self.write_cmd(0xC3, 0x13)
-        self.write_cmd(0xC4, 0x20)
-        self.write_cmd(0xC6, 0x0F)
-
-        self.write_cmd(0xD0, 0xA4, 0xA1)
-        self.write_cmd(0xD6, 0xA1)
-
-        self.write_cmd(self.GMCTRP1,
-                       0xD0, 0x0D, 0x14, 0x0D, 0x0D,
-                       0x09, 0x38, 0x44, 0x4E, 0x3A,
-                       0x17, 0x18, 0x2F, 0x30)
-        self.write_cmd(self.GMCTRN1,
-                       0xD0, 0x09, 0x0F, 0x08, 0x07,
-                       0x14, 0x37, 0x44, 0x4D, 0x38,
-                       0x15, 0x16, 0x2C, 0x2E)
-
-        self.write_cmd(self.INVON)
+        ST7789SPI.init(self)
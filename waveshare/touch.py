@@ -0,0 +1,35 @@
+class TouchPoint:
+    def __init__(self) -> None:
+        self.id = 0
+        self.x = 0
+        self.y = 0
+        self.c = 0
+        self.pressed = False
+
+    def __repr__(self):
+        return f"TouchPoint(id={self.id}, x={self.x}, y={self.y}, c={self.c}, pressed={self.pressed})"
+
+
+class TouchFrame:
+    # Preallocated and refilled in place by every read, so a caller that
+    # keeps data across reads must copy it.
+    def __init__(self, max_points) -> None:
+        self.num = 0
+        self.large = 0
+        self.points = [TouchPoint() for _ in range(max_points)]
+
+    def __len__(self):
+        return self.num
+
+    def __getitem__(self, index):
+        if index >= self.num:
+            raise IndexError(index)
+        return self.points[index]
+
+    def __iter__(self):
+        # only the active fingers
+        for i in range(self.num):
+            yield self.points[i]
+
+    def __repr__(self):
+        return f"TouchFrame(num={self.num}, large={self.large}, points={self.points[:self.num]})"
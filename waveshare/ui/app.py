@@ -1,13 +1,21 @@
 import lvgl as lv
 from uasyncio import create_task, Loop, sleep
 import lv_utils
-from .lv_driver import LVDispDriver, LVTouchInput
+from .lv_driver import LVDispDriver, LVTouchInput, StatsOverlay
 from .pages import *
 from ..board import Board
 
 
 class UIApp:
     lv_disp_factor = 5
+    # measure the display and pick the draw buffers instead of lv_disp_factor
+    lv_disp_auto = False
+    # full frame in PSRAM, LVGL DIRECT mode
+    lv_disp_direct = False
+    # flush counters in lv_display_driver.stats, optionally drawn on screen
+    lv_disp_stats = False
+    lv_disp_stats_overlay = False
+    lv_touch_irq = True
 
     def __init__(self, board: Board) -> None:
         self.board: Board = board
@@ -28,12 +36,19 @@ class UIApp:
             self.lv_event_loop = lv_utils.event_loop(asynchronous=True)
 
         self.lv_display_driver = LVDispDriver(self.width, self.height, display=self.board.display,
-                                              factor=self.lv_disp_factor)
-        self.lv_indev_driver = LVTouchInput(touch=self.board.touch)
+                                              factor=self.lv_disp_factor, auto=self.lv_disp_auto,
+                                              direct=self.lv_disp_direct,
+                                              stats=self.lv_disp_stats or self.lv_disp_stats_overlay)
+        self.lv_stats_overlay = None
+        if self.lv_disp_stats_overlay:
+            self.lv_stats_overlay = StatsOverlay(self.lv_display_driver.stats)
+        self.lv_indev_driver = LVTouchInput(touch=self.board.touch, irq=self.lv_touch_irq)
 
     def deinit(self):
         for page in self.pages:
             page.deinit()
+        if self.lv_stats_overlay is not None:
+            self.lv_stats_overlay.deinit()
         self.board.deinit()
         self.lv_display_driver.deinit()
         lv.deinit()
@@ -69,8 +84,7 @@ class UIApp:
             prev_page.set_next_page(page)
             page.set_prev_page(prev_page)
         else:
-            lv.screen_load(page)
-            page.on_activate()
+            page.load()
         self.pages.append(page)
         return page
 
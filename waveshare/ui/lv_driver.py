@@ -1,24 +1,295 @@
 import lvgl as lv
-from blob import Blob
+from array import array
+from time import ticks_ms, ticks_us, ticks_diff
+from blob import Blob, swap16, heap_stats
+from ..dirty import DirtyRects
+
+
+class FlushStats:
+    # upper bounds of the area histogram in pixels, the last bin is open ended
+    area_bins = (1024, 4096, 16384, 65536)
+
+    def __init__(self) -> None:
+        self.histogram = array('I', bytes(4 * (len(self.area_bins) + 1)))
+        self.reset()
+
+    def reset(self):
+        self.flushes = 0
+        self.frames = 0
+        self.bytes = 0
+        self.spi_us = 0
+        self.spi_max_us = 0
+        self.latency_us = 0
+        self.latency_max_us = 0
+        self.latency_count = 0
+        histogram = self.histogram
+        for i in range(len(histogram)):
+            histogram[i] = 0
+        self.render_started = 0
+        self.render_pending = False
+        self.flush_started = 0
+        # rates over the last window of about a second
+        self.window_start = ticks_ms()
+        self.window_flushes = 0
+        self.window_frames = 0
+        self.window_bytes = 0
+        self.fps = 0
+        self.flush_rate = 0
+        self.byte_rate = 0
+
+    def render_start(self):
+        if not self.render_pending:
+            self.render_started = ticks_us()
+            self.render_pending = True
+
+    def flush_begin(self, pixels, size, last=True):
+        now = ticks_us()
+        self.flush_started = now
+        self.flushes += 1
+        self.window_flushes += 1
+        self.sent(size)
+        i = 0
+        for bound in self.area_bins:
+            if pixels <= bound:
+                break
+            i += 1
+        self.histogram[i] += 1
+        if self.render_pending:
+            # render start to the first flush of the refresh
+            latency = ticks_diff(now, self.render_started)
+            self.latency_us += latency
+            self.latency_count += 1
+            if latency > self.latency_max_us:
+                self.latency_max_us = latency
+            self.render_pending = False
+        if last:
+            self.frames += 1
+            self.window_frames += 1
+
+    def sent(self, size):
+        # bytes on the wire, in the pixel format of the panel interface
+        self.bytes += size
+        self.window_bytes += size
+
+    def flush_end(self, end=None):
+        # end: when the transfer finished, if it is not now
+        if end is None:
+            end = ticks_us()
+        elapsed = max(ticks_diff(end, self.flush_started), 0)
+        self.spi_us += elapsed
+        if elapsed > self.spi_max_us:
+            self.spi_max_us = elapsed
+
+    def update_rates(self):
+        elapsed = ticks_diff(ticks_ms(), self.window_start)
+        if elapsed < 1000:
+            return
+        self.fps = self.window_frames * 1000 // elapsed
+        self.flush_rate = self.window_flushes * 1000 // elapsed
+        self.byte_rate = self.window_bytes * 1000 // elapsed
+        self.window_start = ticks_ms()
+        self.window_flushes = 0
+        self.window_frames = 0
+        self.window_bytes = 0
+
+    def snapshot(self):
+        self.update_rates()
+        flushes = max(self.flushes, 1)
+        return {
+            'flushes': self.flushes,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'fps': self.fps,
+            'flush_rate': self.flush_rate,
+            'byte_rate': self.byte_rate,
+            'spi_avg_us': self.spi_us // flushes,
+            'spi_max_us': self.spi_max_us,
+            'latency_avg_us': self.latency_us // max(self.latency_count, 1),
+            'latency_max_us': self.latency_max_us,
+            'area_bins': self.area_bins,
+            'histogram': tuple(self.histogram),
+        }
+
+
+class StatsOverlay:
+    # one line of FlushStats on the top layer, refreshed every period ms
+    def __init__(self, stats: FlushStats, period=1000) -> None:
+        self.stats = stats
+        label = lv.label(lv.layer_top())
+        label.align(lv.ALIGN.BOTTOM_LEFT, 0, 0)
+        label.set_style_bg_color(lv.color_black(), 0)
+        label.set_style_bg_opa(lv.OPA.COVER, 0)
+        label.set_style_text_color(lv.color_white(), 0)
+        self.label = label
+        self.timer = lv.timer_create(self.update, period, None)
+
+    def update(self, timer):
+        s = self.stats.snapshot()
+        self.label.set_text('%d fps %d kB/s spi %d us lat %d us' % (
+            s['fps'], s['byte_rate'] // 1024, s['spi_avg_us'], s['latency_avg_us']))
+
+    def deinit(self):
+        self.timer.delete()
+        self.label.delete()
 
 
 class LVDispDriver:
-    def __init__(self, width, height, factor=5, display=None) -> None:
+    # auto tuning: candidate buffer sizes (fraction of the screen) and internal
+    # DMA memory kept free for other drivers
+    auto_factors = (2, 3, 4, 5, 8, 10)
+    auto_reserve = 32 * 1024
+    # longest flush of one buffer, and the PSRAM flush rate in percent of the
+    # internal one at which PSRAM buffers are as good
+    auto_flush_ms = 20
+    auto_psram_margin = 90
+
+    def __init__(self, width, height, factor=5, display=None, swap=None, pool=False, auto=False, direct=False,
+                 stats=False) -> None:
         self.display = display
+        # LVGL renders little endian rgb565, big endian panels need it swapped
+        if swap is None:
+            swap = display is not None and not display.little_endian
+        self.swap = swap
         self.disp_drv = lv.display_create(width, height)
 
         color_format = lv.COLOR_FORMAT.RGB565
         self.pixel_size = lv.color_format_get_size(color_format)
         self.disp_drv.set_color_format(color_format)
 
+        # with an asynchronous display LVGL renders into one buffer while the other is sent
+        self.async_flush = display is not None and display.async_flush
+        self.flush_done_cb = self.flush_done
+        # LVGL waits for the previous flush in C, where scheduled callbacks can
+        # not run, so the wait callback completes it; counting the flushes sent
+        # and acknowledged lets a late scheduled callback be ignored
+        self.flushes_sent = 0
+        self.flushes_done = 0
+        self.callbacks = 0
+
         # prepare buffer
-        buf_size = width * height * self.pixel_size // factor
-        self.buf1 = Blob().malloc_dma(buf_size)
-        self.buf2 = Blob().malloc_dma(buf_size)
-        self.disp_drv.set_buffers(self.buf1.mv(), self.buf2.mv(), buf_size, lv.DISPLAY_RENDER_MODE.PARTIAL)
+        self.width = width
+        self.height = height
+        self.tuning = None
+        self.direct = direct
+        if direct:
+            # one full frame in PSRAM at screen coordinates, LVGL only redraws
+            # invalidated areas into it and the last flush of a refresh sends them
+            buf_size = width * height * self.pixel_size
+            self.buf1 = self.alloc(buf_size, True, pool)
+            self.buf2 = None
+            self.stride = width * self.pixel_size
+            self.dirty = DirtyRects(width, height)
+            render_mode = lv.DISPLAY_RENDER_MODE.DIRECT
+        else:
+            count = 2
+            spiram = False
+            if auto and display is not None:
+                factor, count, spiram = self.tune(width, height)
+            buf_size = width * height * self.pixel_size // factor
+            self.buf1 = self.alloc(buf_size, spiram, pool)
+            self.buf2 = self.alloc(buf_size, spiram, pool) if count > 1 else None
+            render_mode = lv.DISPLAY_RENDER_MODE.PARTIAL
+        self.disp_drv.set_buffers(self.buf1.mv(), self.buf2.mv() if self.buf2 else None,
+                                  buf_size, render_mode)
 
-        self.disp_drv.set_render_mode(lv.DISPLAY_RENDER_MODE.PARTIAL)
+        self.disp_drv.set_render_mode(render_mode)
         self.disp_drv.set_flush_cb(self.disp_drv_flush_cb)
+        if self.async_flush:
+            self.disp_drv.set_flush_wait_cb(self.flush_wait_cb)
+
+        self.stats = None
+        if stats:
+            self.stats = FlushStats()
+            self.disp_drv.add_event_cb(self.render_start_cb, lv.EVENT.RENDER_START, None)
+
+    def render_start_cb(self, e):
+        self.stats.render_start()
+
+    @staticmethod
+    def alloc(size, spiram=False, pool=False):
+        # pooled buffers are rounded up to a power of two but reused after deinit
+        if pool:
+            return Blob().malloc_pool(size, spiram=spiram)
+        return Blob().malloc_dma(size, spiram=spiram)
+
+    def measure(self, size, spiram, rows):
+        # bytes per ms of a synchronous flush from a buffer in that memory
+        try:
+            buf = Blob().malloc_dma(size, spiram=spiram)
+        except OSError:
+            return 0
+        buf.fill(0xFF)
+        data = buf.mv()
+        width = size // (rows * self.pixel_size)
+        start = ticks_us()
+        for _ in range(4):
+            self.display.block(0, 0, width - 1, rows - 1, data)
+        elapsed = max(ticks_diff(ticks_us(), start), 1)
+        buf.free()
+        return 4 * size * 1000 // elapsed
+
+    def fit_factor(self, screen, rate, count, free):
+        # the largest buffer whose flush at rate bytes/ms fits the time budget
+        # and of which count fit into free bytes, None if no candidate does
+        for f in self.auto_factors:
+            size = screen // f
+            if size <= rate * self.auto_flush_ms and count * size <= free:
+                return f
+        return None
+
+    def tune(self, width, height):
+        # (factor, count, spiram): one buffer when flushes block, as LVGL can
+        # not render meanwhile. The buffer is sized so one flush takes at most
+        # auto_flush_ms at the measured rate. PSRAM is taken when its rate is
+        # within auto_psram_margin percent of internal memory, which leaves the
+        # DMA memory to other drivers, or when nothing fits internally.
+        count = 2 if self.async_flush else 1
+        screen = width * height * self.pixel_size
+        rows = max(height // self.auto_factors[-1], 1)
+        internal = self.measure(width * rows * self.pixel_size, False, rows)
+        psram = self.measure(width * rows * self.pixel_size, True, rows)
+        free = heap_stats(False)['largest'] - self.auto_reserve
+
+        factor = self.fit_factor(screen, internal, count, free)
+        psram_factor = None
+        if psram > 0:
+            psram_factor = self.fit_factor(screen, psram, count, heap_stats(True)['largest'])
+        spiram = psram_factor is not None and (factor is None or
+                                               psram * 100 >= internal * self.auto_psram_margin)
+        if spiram:
+            factor = psram_factor
+        elif factor is None:
+            factor = self.auto_factors[-1]
+
+        self.tuning = {
+            'factor': factor,
+            'count': count,
+            'spiram': spiram,
+            'buf_size': screen // factor,
+            'internal_bpms': internal,
+            'psram_bpms': psram,
+            'free_dma': free + self.auto_reserve,
+        }
+        return factor, count, spiram
+
+    def flush_done(self, _):
+        # scheduled once per async flush, maybe after flush_wait_cb finished it
+        self.callbacks += 1
+        if self.callbacks > self.flushes_done:
+            self.finish_flush(self.callbacks)
+
+    def flush_wait_cb(self, disp_drv):
+        self.display.wait()
+        if self.flushes_sent > self.flushes_done:
+            self.finish_flush(self.flushes_sent)
+
+    def finish_flush(self, done):
+        # LVGL may only get here after rendering the next band, the bus
+        # timestamps the end of the transfer itself
+        self.flushes_done = done
+        if self.stats is not None:
+            self.stats.flush_end(self.display.done_us())
+        self.disp_drv.flush_ready()
 
     def blit(self, area, data):
         x1 = area.x1
@@ -28,40 +299,119 @@ class LVDispDriver:
 
         self.display.block(x1, y1, x2, y2, data)
 
+    def wire_bytes(self, pixels):
+        # the panel may pack rgb565 into 12 or 18 bits
+        if self.display is None:
+            return pixels * self.pixel_size
+        return self.display.wire_bytes(pixels)
+
+    def swap_rows(self, x0, y0, x1, y1):
+        # LVGL blends on the frame, so a swap for the panel is undone afterwards
+        stride = self.stride
+        start = y0 * stride + x0 * self.pixel_size
+        end = start + (x1 - x0 + 1) * self.pixel_size
+        for _ in range(y1 - y0 + 1):
+            swap16(self.buf1, start, end)
+            start += stride
+            end += stride
+
+    def sync_direct(self):
+        # merged invalidated areas of the frame to the panel, returns the bytes sent
+        dirty = self.dirty
+        display = self.display
+        frame = self.buf1
+        stride = self.stride
+        pixel_size = self.pixel_size
+        sent = 0
+        for x0, y0, x1, y1 in dirty.rects:
+            if self.swap:
+                self.swap_rows(x0, y0, x1, y1)
+            display.block_rows(x0, y0, x1, y1, frame, stride, y0 * stride + x0 * pixel_size)
+            if self.swap:
+                self.swap_rows(x0, y0, x1, y1)
+            # packed rows are padded to a byte each
+            sent += self.wire_bytes(x1 - x0 + 1) * (y1 - y0 + 1)
+        dirty.clear()
+        return sent
+
     def disp_drv_flush_cb(self, disp_drv, area, color_p):
         w = area.x2 - area.x1 + 1
         h = area.y2 - area.y1 + 1
         size = w * h
+        stats = self.stats
+
+        if self.direct:
+            last = disp_drv.flush_is_last()
+            # nothing is sent until the merged areas go out with the last flush
+            if stats is not None:
+                stats.flush_begin(size, 0, last)
+            self.dirty.add(area.x1, area.y1, area.x2, area.y2)
+            if last:
+                sent = self.sync_direct()
+                if stats is not None:
+                    stats.sent(sent)
+            if stats is not None:
+                stats.flush_end()
+            disp_drv.flush_ready()
+            return
+
+        if stats is not None:
+            stats.flush_begin(size, self.wire_bytes(size), disp_drv.flush_is_last())
         data_view = color_p.__dereference__(size * self.pixel_size)
+        if self.swap:
+            swap16(data_view)
+
+        if self.async_flush:
+            self.flushes_sent += 1
+            self.display.block_async(area.x1, area.y1, area.x2, area.y2, data_view, self.flush_done_cb)
+            return
 
         # blit in background
         if self.blit:
             self.blit(area, data_view)
+        if stats is not None:
+            stats.flush_end()
         self.disp_drv.flush_ready()
 
     def deinit(self):
+        if self.display is not None:
+            self.display.wait()
         self.buf1.free()
-        self.buf2.free()
+        if self.buf2 is not None:
+            self.buf2.free()
 
 
 class LVTouchInput:
-    def __init__(self, touch) -> None:
+    def __init__(self, touch, irq=False) -> None:
         self.indev_drv = lv.indev_create()
         self.indev_drv.set_type(lv.INDEV_TYPE.POINTER)
         self.indev_drv.set_read_cb(self.indev_drv_read_cb)
         self.touch = touch
+        # with irq the bus is only read while a touch is pending or held
+        self.irq = irq
+        self.pending = True
+        self.pressed = False
+        if irq:
+            touch.irq(self.touch_irq_cb)
+
+    def touch_irq_cb(self, _):
+        self.pending = True
 
     def indev_drv_read_cb(self, indev_drv, data):
-        info = self.touch.read()
-        if info is None:
+        if self.irq and not (self.pending or self.pressed):
+            data.state = lv.INDEV_STATE.RELEASED
             return
-        if info.num == 0:
+        self.pending = False
+        self.pressed = False
+        info = self.touch.read()
+        if info is None or info.num == 0:
             data.state = lv.INDEV_STATE.RELEASED
             return
         pt = info.points[0]
         if not pt.pressed:
-            lv.INDEV_STATE.RELEASED
+            data.state = lv.INDEV_STATE.RELEASED
             return
+        self.pressed = True
         data.state = lv.INDEV_STATE.PRESSED
         data.point.x = pt.x
         data.point.y = pt.y
@@ -6,6 +6,11 @@ class Page(lv.obj):
     prev_page = None
     next_btn = None
     next_page = None
+    # static pages put the panel in partial/idle mode while shown,
+    # static_area is (start, end) panel rows or None for the whole panel
+    static = False
+    static_area = None
+    static_idle = True
 
     def __init__(self, board):
         self.board = board
@@ -20,6 +25,18 @@ class Page(lv.obj):
     def on_deactivate(self):
         pass
 
+    def apply_display_mode(self):
+        display = self.board.display
+        if self.static:
+            display.set_power_mode(self.static_area, self.static_idle)
+        else:
+            display.set_power_mode()
+
+    def load(self):
+        lv.screen_load(self)
+        self.apply_display_mode()
+        self.on_activate()
+
     def set_prev_page(self, page):
         btn = lv.button(self)
         btn.align(lv.ALIGN.TOP_LEFT, 5, 5)
@@ -28,8 +45,7 @@ class Page(lv.obj):
 
         def callback(e):
             self.on_deactivate()
-            lv.screen_load(page)
-            page.on_activate()
+            page.load()
 
         btn.add_event_cb(callback, lv.EVENT.CLICKED, None)
         self.prev_page = page
@@ -43,8 +59,7 @@ class Page(lv.obj):
 
         def callback(e):
             self.on_deactivate()
-            lv.screen_load(page)
-            page.on_activate()
+            page.load()
 
         btn.add_event_cb(callback, lv.EVENT.CLICKED, None)
         self.next_page = page
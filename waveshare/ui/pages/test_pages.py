@@ -40,6 +40,8 @@ class SliderPage(Page):
 
 
 class IMUPage(Page):
+    odr = 31.25
+
     def __init__(self, board):
         super().__init__(board)
         label = lv.label(self)
@@ -47,23 +49,37 @@ class IMUPage(Page):
         label.set_text("imu data:")
         self.imu_label = label
         self.task = None
+        # rate of the sensor before the page took it over
+        self.previous_odr = None
 
     def on_activate(self):
         if self.task:
             self.task.cancel()
+        imu = self.board.imu
+        if self.previous_odr is None:
+            self.previous_odr = imu.odr
+        imu.set_output_data_rate(self.odr)
+        imu.enable_data_ready()
         self.task = create_task(self.update_imu())
 
     def on_deactivate(self):
         if self.task is not None:
             self.task.cancel()
             self.task = None
+        if self.previous_odr is not None:
+            imu = self.board.imu
+            imu.disable_data_ready()
+            imu.set_output_data_rate(self.previous_odr)
+            self.previous_odr = None
 
     async def update_imu(self):
+        imu = self.board.imu
         while True:
+            # reading the sample also releases the data ready line
             (ax, ay, az), (gx, gy, gz) = self.board.read_imu()
             self.imu_label.set_text(f"imu data: {ax:.1f}, {ay:.1f}, {az:.1f}\n"
                                     f"          {gx:.1f}, {gy:.1f}, {gz:.1f}")
-            await sleep(0.1)
+            await imu.wait_data_ready()
 
 
 class MusicPage(Page):
@@ -116,9 +132,11 @@ class MusicPage(Page):
         # freq = 440
         tick = 0
         writter = StreamWriter(self.i2s)
-        while tick < len(data_wav):
+        # slices of a memoryview do not copy the samples
+        samples = memoryview(data_wav)
+        while tick < len(samples):
             # data = self.get_samples(freq, tick)
-            data = data_wav[tick:tick+self.batch]
+            data = samples[tick:tick+self.batch]
             tick += self.batch
             writter.write(data)
             await writter.drain()